@@ -1,19 +1,22 @@
 import customtkinter
 import Metadata
 import ucs
-from ixml import BWFMetadataWriter
+import ucsData
+from exportEngine import BatchExporter, ExportJob, ExportManifest, DEFAULT_WORKERS
+from ixml import DEFAULT_RESERVE_SIZE
 import os
 from CTkMessagebox import CTkMessagebox
+import tkinter
 from tkinter import filedialog
-import shutil
 import sys
 from CTkToolTip import CTkToolTip
 
 ctki = customtkinter
-configInstance = getattr(Metadata, 'configMan', None)
-if configInstance is None:
-    Metadata.config()
-config = Metadata.configMan
+
+# Delay after startup before the UCS list is loaded in the background (ms)
+UCS_WARM_UP_DELAY_MS = 300
+# Loaded on first use rather than at import
+config = Metadata.lazyConfig
 
 class App(customtkinter.CTk):
     def __init__(self):
@@ -31,6 +34,8 @@ class App(customtkinter.CTk):
         self.selectedFile: str
         self.ucs_popup = None
         self.setCatIDAll = False
+        self.exporter = None
+        self.protocol("WM_DELETE_WINDOW", self.onClose)
         
         self.fileSelection = customtkinter.CTkComboBox(self, values=Metadata.fileNames(), command=self.fileSelection_callback)
         self.fileSelection.grid(row=0, column=0, padx=10, pady=(10,0), sticky="new")
@@ -48,6 +53,17 @@ class App(customtkinter.CTk):
         self.catID_textbox = ctki.CTkEntry(self.catID_frame, placeholder_text="Enter category ID...")
         self.catID_textbox.grid(row=0, column=1, padx=5, pady=10, sticky="ew")
         
+        # CatID autocomplete: suggestions are listed under the entry as you type
+        self.ucsExcelPath = self.getResourcePath(os.path.join('src', 'UCS_List.xlsx'))
+        self.ucs = None  # Shared ucsData.UCSCatalog, once loaded
+        self.catIDSuggestions = []
+        self.classify_review = None
+        self.catIDList = tkinter.Listbox(self, height=ucsData.AUTOCOMPLETE_LIMIT, activestyle='none', exportselection=False,
+                                         bg='#2b2b2b', fg='white', selectbackground='#524d77', highlightthickness=0)
+        self.catIDList.bind('<ButtonRelease-1>', self.onCatIDSuggestionClick)
+        self.catID_textbox.bind('<KeyRelease>', self.onCatIDKey)
+        self.catID_textbox.bind('<FocusOut>', lambda event: self.after(150, self.hideCatIDSuggestions))
+        
         self.cat_textbox = ctki.CTkEntry(self.catID_frame, placeholder_text="category")
         self.cat_textbox.grid(row=1, column=1, padx=5, pady=10, sticky="ew")
         
@@ -62,6 +78,10 @@ class App(customtkinter.CTk):
         
         self.catID_button = ctki.CTkButton(self.catID_frame, text="Add", width=60, command=self.catID_button_callback,fg_color=self.magenta_accent,hover_color=self.magenta_hover)
         self.catID_button.grid(row=0, column=2, padx=(5, 10), pady=10, sticky="e")
+        
+        self.classify_button = ctki.CTkButton(self.catID_frame, text="Auto", width=60, command=self.autoClassify,fg_color=self.magenta_accent,hover_color=self.magenta_hover)
+        self.classify_button.grid(row=1, column=2, padx=(5, 10), pady=10, sticky="e")
+        CTkToolTip(self.classify_button, message='Suggest a CatID for every file from its name and review the suggestions.', follow=True)
         #Additional Required
         self.additionalRequired_frame = ctki.CTkFrame(self.scrollFrame, corner_radius=8)
         self.additionalRequired_frame.grid(row=2,column=0,padx=10,pady=10,sticky='ew')
@@ -148,9 +168,13 @@ class App(customtkinter.CTk):
             if t is not None and t != '':
                 self.dir_entry.delete(0,ctki.END)
                 self.dir_entry.insert(0, t)
+        
+        # Build the UCS table and indexes off the UI thread once the window is up,
+        # so the CatID popup, autocomplete and Auto don't have to
+        self.after(UCS_WARM_UP_DELAY_MS, lambda: ucsData.warm_up(self.ucsExcelPath, Metadata.currentDir))
      
     def setUiValues(self, file):
-        if file in config.config:
+        if config.section_exists(file):
             for k, v in self.basicConfig.items():
                 v.delete(0, ctki.END)
                 v.insert(0, config.get_value(file, k))
@@ -166,6 +190,11 @@ class App(customtkinter.CTk):
         Metadata.setSelectedFile(value)
         self.setUiValues(value)
     
+    def onClose(self):
+        # Write any config changes still waiting for the write-behind timer
+        config.commit()
+        self.destroy()
+    
     def getResourcePath(self, relativePath):
         try:
             base_path = sys._MEIPASS # type: ignore
@@ -179,18 +208,13 @@ class App(customtkinter.CTk):
             catID = self.catID_textbox.get()
             cat = self.cat_textbox.get()
             sub = self.sub_textbox.get()
-            for file in Metadata.fileNames():
-                config.add_section(file, 'Basic File')
-                config.set_value(file, 'catid', catID)
-                config.set_value(file, 'category', cat)
-                config.set_value(file, 'subcategory', sub)
-                config.save_config()
+            config.apply_to_all(Metadata.fileNames(), {'catid': catID, 'category': cat, 'subcategory': sub})
         # print("HELLO")
         # self.fileSelection.configure(state="enable")
         # self.catID_button.configure(state="enable")
 
     def catID_button_callback(self):
-        excelPath = self.getResourcePath(os.path.join('src', 'UCS_List.xlsx'))
+        excelPath = self.ucsExcelPath
 
         if self.selectedFile is None:
             CTkMessagebox(title='Selection Error', message='Please select a file first.', icon='warning',
@@ -204,7 +228,8 @@ class App(customtkinter.CTk):
                                          self.cat_textbox,
                                          self.sub_textbox,
                                          self.catID_checkbox, # This is your 'ucsAll' parameter
-                                         on_close_callback=self.on_ucs_popup_close) # <--- PASS THE CALLBACK HERE
+                                         on_close_callback=self.on_ucs_popup_close, # <--- PASS THE CALLBACK HERE
+                                         cache_dir=Metadata.currentDir)
             
             # REMOVE THIS LINE:
             # self.ucs_popup.protocol("WM_DELETE_WINDOW", self.on_ucs_popup_close)
@@ -215,15 +240,117 @@ class App(customtkinter.CTk):
         else:
             self.ucs_popup.lift() # Bring existing popup to front
         
+    def loadUCSCatalog(self):
+        """The shared UCS table and indexes (normally ready from the warm-up), or None if unavailable"""
+        try:
+            self.ucs = ucsData.load_catalog(self.ucsExcelPath, Metadata.currentDir)
+        except Exception as e:
+            print(f'UCS list unavailable: {e}')
+            return None
+        return self.ucs
+    
+    def readyUCSCatalog(self):
+        """The shared UCS catalog if it's loaded, without blocking the UI (None while loading or unavailable)"""
+        catalog = ucsData.catalog_if_ready(self.ucsExcelPath)
+        if catalog is None:
+            # Load it for the next keystrokes, unless it already failed (the CatID popup retries)
+            if ucsData.catalog_error(self.ucsExcelPath) is None:
+                ucsData.warm_up(self.ucsExcelPath, Metadata.currentDir)
+            return None
+        self.ucs = catalog
+        return catalog
+    
+    def onCatIDKey(self, event):
+        if event.keysym in ('Down', 'Up'):
+            if self.catIDSuggestions:
+                current = self.catIDList.curselection()
+                index = (current[0] if current else -1) + (1 if event.keysym == 'Down' else -1)
+                index = max(0, min(len(self.catIDSuggestions) - 1, index))
+                self.catIDList.selection_clear(0, tkinter.END)
+                self.catIDList.selection_set(index)
+            return
+        if event.keysym == 'Return':
+            current = self.catIDList.curselection()
+            if self.catIDSuggestions:
+                self.acceptCatIDSuggestion(self.catIDSuggestions[current[0] if current else 0])
+            return
+        if event.keysym == 'Escape':
+            self.hideCatIDSuggestions()
+            return
+        catalog = self.readyUCSCatalog()
+        if catalog is None:
+            self.hideCatIDSuggestions()
+            return
+        self.showCatIDSuggestions(catalog.prefix_index.complete(self.catID_textbox.get()))
+    
+    def showCatIDSuggestions(self, rows):
+        """List rows under the CatID entry as 'CatID  Category / SubCategory'"""
+        self.catIDSuggestions = rows
+        if not rows:
+            self.hideCatIDSuggestions()
+            return
+        columns = self.ucs.columns
+        self.catIDList.delete(0, tkinter.END)
+        self.catIDList.insert(tkinter.END, *(f"{columns['CatID'][row]}  {columns['Category'][row]} / {columns['SubCategory'][row]}"
+                                             for row in rows))
+        self.catIDList.configure(height=len(rows))
+        entry = self.catID_textbox
+        self.catIDList.place(x=entry.winfo_rootx() - self.winfo_rootx(),
+                             y=entry.winfo_rooty() - self.winfo_rooty() + entry.winfo_height(),
+                             width=entry.winfo_width())
+        self.catIDList.lift()
+    
+    def hideCatIDSuggestions(self):
+        self.catIDSuggestions = []
+        self.catIDList.place_forget()
+    
+    def onCatIDSuggestionClick(self, event):
+        index = self.catIDList.nearest(event.y)
+        if 0 <= index < len(self.catIDSuggestions):
+            self.acceptCatIDSuggestion(self.catIDSuggestions[index])
+    
+    def acceptCatIDSuggestion(self, row):
+        """Fill CatID, category and subcategory from a UCS row, as choosing it in the UCS list does"""
+        columns = self.ucs.columns
+        for entry, column in ((self.catID_textbox, 'CatID'), (self.cat_textbox, 'Category'), (self.sub_textbox, 'SubCategory')):
+            entry.delete(0, ctki.END)
+            entry.insert(0, columns[column][row])
+        self.hideCatIDSuggestions()
+        self.on_ucs_popup_close()
+    
+    def autoClassify(self):
+        """Suggest CatIDs for all files from their names and open the review window"""
+        catalog = self.loadUCSCatalog()
+        if catalog is None:
+            CTkMessagebox(title='UCS List Error', message='The UCS list could not be loaded.', icon='cancel',
+                          option_1='OK', button_color=self.magenta_accent, button_hover_color=self.magenta_hover)
+            return
+        if self.classify_review is not None and self.classify_review.winfo_exists():
+            self.classify_review.lift()
+            return
+        files = Metadata.fileNames()
+        results = catalog.classifier.classify_many(files)
+        current = {file: config.get_value(file, 'catid') or '' for file in files}
+        self.classify_review = ucs.ClassificationReview(self, results, catalog.columns, current,
+                                                        lambda chosen: self.applyClassifications(catalog, chosen))
+    
+    def applyClassifications(self, catalog, chosen):
+        """Set CatID, category and subcategory of each file in {file: row of catalog}"""
+        columns = catalog.columns
+        files = list(chosen)
+        config.set_many(files, {key: [columns[column][row] for row in chosen.values()]
+                                for key, column in (('catid', 'CatID'), ('category', 'Category'), ('subcategory', 'SubCategory'))},
+                        'Basic File')
+        if self.selectedFile in chosen:
+            self.setUiValues(self.selectedFile)
+    
     def catID_checkbox_callback(self):
         if self.catID_checkbox.get():
             self.setCatIDAll = True
             if not self.cat_textbox == '':
-                for file in Metadata.fileNames():
-                    config.add_section(file, 'Basic File')
-                    config.set_value(file, 'catid', self.catID_textbox.get())
-                    config.set_value(file, 'category', self.cat_textbox.get())
-                    config.set_value(file, 'subcategory', self.sub_textbox.get())
+                config.apply_to_all(Metadata.fileNames(), {'catid': self.catID_textbox.get(),
+                                                           'category': self.cat_textbox.get(),
+                                                           'subcategory': self.sub_textbox.get()})
         else:
             self.setCatIDAll = False
     
@@ -232,44 +359,31 @@ class App(customtkinter.CTk):
         if config.add_section(self.selectedFile, 'Basic File'):
             config.set_value(self.selectedFile, 'FX Name', currentText)
         if self.fxName_checkbox.get():
-            for i,file in enumerate(Metadata.fileNames()):
-                config.add_section(file, 'Basic File')
-                if i < 10:
-                    config.set_value(file, 'FX Name', f'{currentText}_0{i+1}')
-                else:
-                    config.set_value(file, 'FX Name', f'{currentText}_{i+1}')
-                config.save_config()
+            files = Metadata.fileNames()
+            config.apply_to_all(files, {'FX Name': self.numberedFxNames(currentText, len(files))})
             
     def fxName_checkbox_callback(self):
         if self.fxName_checkbox.get():
             if not self.fxName_var.get() == '':
-                for i,file in enumerate(Metadata.fileNames()):
-                    currentText = self.fxName_var.get()
-                    config.add_section(file, 'Basic File')
-                    if i < 10:
-                        config.set_value(file, 'FX Name', f'{currentText}_0{i+1}')
-                    else:
-                        config.set_value(file, 'FX Name', f'{currentText}_{i+1}')
-                    config.save_config()
+                files = Metadata.fileNames()
+                config.apply_to_all(files, {'FX Name': self.numberedFxNames(self.fxName_var.get(), len(files))})
+    
+    def numberedFxNames(self, fxName, count):
+        """FX Names for files applied to all: fxName_01, fxName_02, ..."""
+        return [f'{fxName}_0{i+1}' if i < 10 else f'{fxName}_{i+1}' for i in range(count)]
             
     def onCreatorChange(self, var_name, index, mode):
         currentText = self.creator_var.get()
         if config.add_section(self.selectedFile, 'Basic File'):
             config.set_value(self.selectedFile, 'creator id', currentText)
         if self.creator_checkbox.get():
-            for file in Metadata.fileNames():
-                config.add_section(file, 'Basic File')
-                config.set_value(file, 'creator id', currentText)
-                config.save_config()
+            config.apply_to_all(Metadata.fileNames(), {'creator id': currentText})
     
     def creator_checkbox_callback(self):
         if self.creator_checkbox.get():
             currentText = self.creator_var.get()
             if not currentText == '':
-                for file in Metadata.fileNames():
-                    config.add_section(file, 'Basic File')
-                    config.set_value(file, 'creator id', currentText)
-                    config.save_config()
+                config.apply_to_all(Metadata.fileNames(), {'creator id': currentText})
                     
     def universalOnChange(self,cb: ctki.CTkCheckBox, text: str, key: str, advSection: bool = True):
         if advSection:
@@ -280,32 +394,14 @@ class App(customtkinter.CTk):
             fileKey = self.selectedFile
         if config.add_section(fileKey, section):
             config.set_value(fileKey, key, text)
-            config.save_config
+            config.save_config()
         if cb.get():
-            for file in Metadata.fileNames():
-                if advSection:
-                    config.add_section(file + "_adv", section)
-                    config.set_value(file + "_adv", key, text)
-                else:
-                    config.add_section(file, section)
-                    config.set_value(file, key, text)
-                config.save_config()
+            config.apply_to_all(Metadata.fileNames(), {key: text}, advanced=advSection)
                 
     def universalCallback(self, var: ctki.StringVar, key: str, advSection: bool = True):
         currText = var.get()
-        if advSection:
-            section = 'Advanced File'
-        else:
-            section = 'Basic File'
         if not currText == '':
-            for file in Metadata.fileNames():
-                if advSection:
-                    config.add_section(file + "_adv", section)
-                    config.set_value(file + "_adv", key, currText)
-                else:
-                    config.add_section(file, section)
-                    config.set_value(file, key, currText)
-                config.save_config()
+            config.apply_to_all(Metadata.fileNames(), {key: currText}, advanced=advSection)
                     
     def onUserCatChange(self, var_name, index, mode):
         currentText = self.userCat_var.get()
@@ -648,10 +744,7 @@ class App(customtkinter.CTk):
         if self.microphoneConfiguration_cb.get():
             currText = self.microphoneConfiguration_combo.get()
             if not currText == '':
-                for file in Metadata.fileNames():
-                    config.add_section(file + "_adv", "Advanced File")
-                    config.set_value(file + '_adv', 'Microphone Configuration', currText)
-                config.save_config()
+                config.apply_to_all(Metadata.fileNames(), {'Microphone Configuration': currText}, advanced=True)
     
     def micPerspective_combo_callback(self, value):
         currentText = value
@@ -661,10 +754,7 @@ class App(customtkinter.CTk):
         if self.micPerspective_cb.get():
             currText = self.micPerspective_combo.get()
             if not currText == '':
-                for file in Metadata.fileNames():
-                    config.add_section(file + "_adv", "Advanced File")
-                    config.set_value(file + '_adv', 'Microphone Perspective', currText)
-                config.save_config()
+                config.apply_to_all(Metadata.fileNames(), {'Microphone Perspective': currText}, advanced=True)
     
     def inOut_combo_callback(self,value):
         currentText = value
@@ -674,10 +764,7 @@ class App(customtkinter.CTk):
         if self.inOut_cb.get():
             currText = self.inOut_combo.get()
             if not currText == '':
-                for file in Metadata.fileNames():
-                    config.add_section(file + "_adv", "Advanced File")
-                    config.set_value(file + '_adv', 'Inside or Outside', currText)
-                config.save_config()
+                config.apply_to_all(Metadata.fileNames(), {'Inside or Outside': currText}, advanced=True)
     
     def onLibraryChange(self, var_name, index, mode):
         currentText = self.library_var.get()
@@ -717,7 +804,8 @@ class App(customtkinter.CTk):
             skipCurrentFile = False
             for i, (k, v) in enumerate(self.basicConfig.items()):
                 if i <= 4:
-                    currentValue = config.get_value(file, k)
+                    # Values set on the file or its batch count, template defaults don't
+                    currentValue = config.get_user_value(file, k)
                     if currentValue == '' or currentValue is None:
                         if skipAll:
                             skipArray.append(file)
@@ -743,29 +831,96 @@ class App(customtkinter.CTk):
                     break
             if skipCurrentFile:
                 continue
-        with open(os.path.join(Metadata.currentDir,'src','files.txt'),'r',encoding='utf-8') as f:
-            for fileSource in f:
-                longfile = fileSource.strip()
-                file = os.path.basename(longfile)
-                print(file)
-                # os.path.basename(file_line.strip())
-                if file in skipArray:
-                    continue
-                filename = f"{config.get_value(file,'catid')}_{config.get_value(file,'FX Name')}_{config.get_value(file,'creator id')}.wav"
-                destinationPath = os.path.join(self.dir_entry.get(),filename)
-                try:
-                    shutil.copy2(longfile,destinationPath)
-                    
-                    userFields = config.metadata[file]
-                    print(config.metadata[file])
-                    ixmlWriter = BWFMetadataWriter(destinationPath, userFields)
-                    # result = ixmlWriter.writeToWav(destinationPath, userFields)
-                    # if not ixmlWriter[0]:
-                    #     CTkMessagebox(title='Write Error', message=f'Metadata Error: \n{result[1]}',icon='warning',option_1='OK',button_color=self.magenta_accent,button_hover_color=self.magenta_hover)
-                except FileNotFoundError:
-                    CTkMessagebox(title='File Error',message=f'Source File {longfile} not found.', icon='warning',option_1='OK',button_color=self.magenta_accent,button_hover_color=self.magenta_hover)
-                except PermissionError:
-                    CTkMessagebox(title='Permission Error',message=f'Permission was denied when trying to create {destinationPath}.',icon='warning',option_1='OK',button_color=self.magenta_accent,button_hover_color=self.magenta_hover)
-                except Exception as e:
-                    CTkMessagebox(title='Unexpected Error!',message=f'An unexpected error occurred with {longfile}\n\n{e}',icon='warning',option_1='OK',button_color=self.magenta_accent,button_hover_color=self.magenta_hover)
-        
\ No newline at end of file
+        jobs = []
+        preFailed = []
+        for longfile in Metadata.registry.paths():
+            file = os.path.basename(longfile)
+            if file in skipArray:
+                continue
+            filename = f"{config.get_value(file,'catid')}_{config.get_value(file,'FX Name')}_{config.get_value(file,'creator id')}.wav"
+            destinationPath = os.path.join(self.dir_entry.get(),filename)
+            if file not in config.metadata:
+                preFailed.append(f'No metadata has been set for {longfile}.')
+                continue
+            # Copy and embed in one pass (source is read once, destination written once)
+            jobs.append(ExportJob(longfile, destinationPath, dict(config.metadata[file])))
+        self.startExport(jobs, preFailed)
+    
+    def startExport(self, jobs, preFailed):
+        """Run the export on a worker pool and show progress until it finishes"""
+        if self.exporter is not None:
+            return
+        try:
+            workers = int(config.get_value('USER', 'Export Workers', DEFAULT_WORKERS))
+        except ValueError:
+            workers = DEFAULT_WORKERS
+        useProcesses = config.get_value('USER', 'Export Pool', 'thread') == 'process'
+        # Incremental export skips files whose source, metadata and destination are unchanged
+        manifest = None
+        if config.get_value('USER', 'Incremental Export', 'True') == 'True':
+            manifest = ExportManifest(os.path.join(Metadata.currentDir, 'export_manifest.json'))
+        hashSources = config.get_value('USER', 'Hash Sources', 'False') == 'True'
+        # Padding kept after each file's metadata so later metadata-only exports are written in place
+        try:
+            reserveSize = max(0, int(config.get_value('USER', 'Reserve Size', DEFAULT_RESERVE_SIZE)))
+        except ValueError:
+            reserveSize = DEFAULT_RESERVE_SIZE
+        
+        self.exportPreFailed = preFailed
+        self.exporter = BatchExporter(jobs, max_workers=workers, use_processes=useProcesses, manifest=manifest, hash_sources=hashSources,
+                                      reserve_size=reserveSize)
+        
+        self.button.configure(state='disabled')
+        self.export_frame = ctki.CTkFrame(self.scrollFrame, corner_radius=8)
+        self.export_frame.grid(row=11, column=0, padx=10, pady=10, sticky='ew')
+        self.export_frame.grid_columnconfigure(0, weight=1)
+        
+        self.export_progress = ctki.CTkProgressBar(self.export_frame, progress_color=self.magenta_accent)
+        self.export_progress.grid(row=0, column=0, padx=10, pady=(10,5), sticky='ew')
+        self.export_progress.set(0)
+        
+        self.export_label = ctki.CTkLabel(self.export_frame, text=f'Exporting 0 of {len(jobs)}...')
+        self.export_label.grid(row=1, column=0, padx=10, pady=(0,10), sticky='w')
+        
+        self.export_cancel = ctki.CTkButton(self.export_frame, text='Cancel', width=60, command=self.cancelExport, fg_color=self.magenta_accent, hover_color=self.magenta_hover)
+        self.export_cancel.grid(row=0, column=1, rowspan=2, padx=(5,10), pady=10)
+        
+        self.exporter.start()
+        self.after(100, self.pollExport)
+    
+    def pollExport(self):
+        for event in self.exporter.poll():
+            if event[0] == 'result':
+                _, result, done, total = event
+                self.export_progress.set(done / total)
+                eta = self.exporter.eta(done)
+                etaText = f' - about {int(eta // 60)}:{int(eta % 60):02d} left' if eta is not None and done < total else ''
+                self.export_label.configure(text=f'Exported {done} of {total}{etaText}')
+            elif event[0] == 'finished':
+                self.finishExport(event[1])
+                return
+        self.after(100, self.pollExport)
+    
+    def cancelExport(self):
+        if self.exporter is not None:
+            self.exporter.cancel()
+            self.export_cancel.configure(state='disabled')
+            self.export_label.configure(text='Cancelling after the files in progress...')
+    
+    def finishExport(self, summary):
+        self.exporter = None
+        self.export_frame.destroy()
+        self.button.configure(state='normal')
+        
+        errors = self.exportPreFailed + [result.error for result in summary.failed]
+        message = f'Exported {summary.succeeded} of {summary.total + len(self.exportPreFailed)} files in {summary.seconds:.1f}s.'
+        if summary.skipped:
+            message += f'\n{summary.skipped} unchanged files were skipped.'
+        if summary.cancelled:
+            message += f'\n{summary.cancelled} files were cancelled.'
+        if errors:
+            message += f'\n\n{len(errors)} files failed:\n' + '\n'.join(errors[:10])
+            if len(errors) > 10:
+                message += f'\n...and {len(errors) - 10} more.'
+        CTkMessagebox(title='Export Finished' if not errors else 'Export Finished With Errors', message=message,
+                      icon='check' if not errors else 'warning', option_1='OK', button_color=self.magenta_accent, button_hover_color=self.magenta_hover)
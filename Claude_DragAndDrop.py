@@ -1,9 +1,12 @@
 import customtkinter as ctk
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import os
+import struct
 import tkinter as tk
 import tkinter.messagebox
 from datetime import datetime # Added this global import as it's used in get_current_time
+from riffIndex import RiffIndex
+import Metadata
 
 global currentDir
 currentDir = os.path.dirname(__file__)
@@ -167,9 +170,8 @@ class DragDropApp:
         Callback function executed when the user tries to close the window.
         You can perform cleanup or ask for confirmation here.
         """
-        with open(currentDir + "\\src\\files.txt", "w", newline="") as f:
-            for file in self.files:
-                f.write(file + "\n")
+        # Saves files.txt and updates the list the main window reads
+        Metadata.registry.replace(self.files)
         
         # if tkinter.messagebox.askokcancel("Exit Application", "Do you really want to exit?"):
             # Perform any cleanup actions here if necessary
@@ -435,6 +437,10 @@ class DragDropApp:
         filename = os.path.basename(file_path)
         file_size = self.get_file_size(file_path)
         file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext == '.wav':
+            duration = self.get_wav_duration(file_path)
+            if duration:
+                file_size = f"{duration} | {file_size}"
         
         # Get file icon based on extension
         icon = self.get_file_icon(file_ext)
@@ -627,6 +633,17 @@ class DragDropApp:
         except:
             return "Unknown size"
             
+    def get_wav_duration(self, file_path):
+        """Get human-readable duration of a WAV file from its chunk headers (no audio is read)"""
+        try:
+            seconds = RiffIndex(file_path).duration()
+        except (OSError, ValueError, struct.error):
+            return None
+        if seconds is None:
+            return None
+        minutes, seconds = divmod(int(round(seconds)), 60)
+        return f"{minutes}:{seconds:02d}"
+            
     def remove_file(self, file_path, file_frame):
         """Remove a file from the list"""
         if file_path in self.files:
@@ -1,5 +1,3 @@
-import tkinter
-from tkinter import filedialog
 import os
 from os.path import isfile, join
 import configManager
@@ -22,44 +20,158 @@ def config():
     currentDir = os.path.dirname(__file__)
 
     config_path = os.path.join(currentDir, "config.ini")
-
-    if not os.path.exists(config_path):
-        print(f"Config file not found at {config_path}. Creating default config.")
-        configMan = configManager.ConfigManager(config_path)
-        configMan.create_default_config()
+    db_path = os.path.join(currentDir, "config.db")
+
+    if os.environ.get('METADATA_BACKEND', '').lower() == 'sqlite' or os.path.exists(db_path):
+        # SQLite metadata store; config.ini is imported the first time
+        import metadataStore
+        print(f"Using metadata store at {db_path}.")
+        configMan = metadataStore.SQLiteConfigManager(db_path, import_from=config_path, path_resolver=sourcePath)
+        registry.listeners.append(configMan.paths_changed)
     else:
-        print(f"Config file found at {config_path}. Loading existing config.")
+        # The constructor loads config.ini, or creates it with default settings
         configMan = configManager.ConfigManager(config_path)
-        configMan.load_config() # <--- IMPORTANT: Load existing config
 
     isConfig = True
     print("Metadata.config() completed. configMan is now initialized.")
 
+def getConfig():
+    """
+    Returns the ConfigManager, running config() the first time it's needed.
+    """
+    if not isConfig or configMan is None:
+        config()
+    return configMan
+
+class LazyConfig:
+    """
+    Stand-in for configMan that loads the config on first attribute access,
+    so importing a module that holds it doesn't read (or create) config.ini.
+    """
+
+    def __getattr__(self, name):
+        return getattr(getConfig(), name)
+
+lazyConfig = LazyConfig()
+
+
+class FileRegistry:
+    """
+    In-memory list of the source files in 'src/files.txt'.
+    Holds the full paths in order, with O(1) lookup by path or basename and a
+    stable ID per path. files.txt is only re-read when its mtime changes;
+    add(), remove() and replace() update the list (and files.txt) directly.
+    """
+
+    def __init__(self, listFile):
+        self.listFile = listFile
+        self._stamp = None      # (mtime_ns, size) of files.txt when last read
+        self._paths = []
+        self._listed = set()
+        self._names = []
+        self._byName = {}       # basename -> full path (first listed wins)
+        self._ids = {}          # full path -> ID, kept across reloads
+        self._nextId = 1
+        self.listeners = []     # Called with no arguments after the list changes
+
+    def _fileStamp(self):
+        try:
+            st = os.stat(self.listFile)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self):
+        """Re-read files.txt if it changed since it was last read"""
+        stamp = self._fileStamp()
+        if stamp == self._stamp:
+            return
+        paths = []
+        if stamp is None:
+            print(f"Warning: {self.listFile} not found.")
+        else:
+            try:
+                with open(self.listFile, "r", encoding="utf-8") as f:
+                    paths = [line.strip() for line in f if line.strip()]
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error reading files.txt: {e}")
+        self._stamp = stamp
+        self._setPaths(paths)
+
+    def _setPaths(self, paths):
+        self._paths = list(dict.fromkeys(paths))
+        self._listed = set(self._paths)
+        self._names = [os.path.basename(path) for path in self._paths]
+        self._byName = {}
+        for name, path in zip(self._names, self._paths):
+            self._byName.setdefault(name, path)
+            if path not in self._ids:
+                self._ids[path] = self._nextId
+                self._nextId += 1
+        for listener in self.listeners:
+            listener()
+
+    def paths(self):
+        """Full paths in order (shared list, don't modify)"""
+        self.refresh()
+        return self._paths
+
+    def names(self):
+        """Basenames in order (shared list, don't modify)"""
+        self.refresh()
+        return self._names
+
+    def path(self, name, default=None):
+        """Full path of a listed file, looked up by basename"""
+        self.refresh()
+        return self._byName.get(name, default)
+
+    def id(self, path):
+        """Stable ID of a listed path (or basename), or None"""
+        self.refresh()
+        path = self._byName.get(path, path)
+        return self._ids[path] if path in self._listed else None
+
+    def contains(self, path):
+        """True if a full path or basename is listed"""
+        self.refresh()
+        return path in self._listed or path in self._byName
+
+    def add(self, paths):
+        """Append paths that aren't listed yet and save files.txt"""
+        self.replace(self.paths() + [path for path in paths if path not in self._listed])
+
+    def remove(self, paths):
+        """Drop paths from the list and save files.txt"""
+        removed = set(paths)
+        self.replace([path for path in self.paths() if path not in removed])
+
+    def replace(self, paths):
+        """Set the whole list and save files.txt"""
+        self._setPaths(paths)
+        try:
+            with open(self.listFile, "w", encoding="utf-8", newline="") as f:
+                for path in self._paths:
+                    f.write(path + "\n")
+        except OSError as e:
+            print(f"Error writing files.txt: {e}")
+        self._stamp = self._fileStamp()
+
+
+registry = FileRegistry(os.path.join(currentDir, "src", "files.txt"))
 
 def fileNames():
     """
-    Reads file names from 'src/files.txt' and returns their basenames.
-    """
-    # Ensure currentDir is defined (it should be by the global init or config() call)
-    if not currentDir:
-        config() # Ensure config is run to set currentDir
-    
-    files_txt_path = os.path.join(currentDir, "src", "files.txt")
-    
-    if not os.path.exists(files_txt_path):
-        print(f"Warning: {files_txt_path} not found.")
-        return []
-
-    file_names_list = []
-    try:
-        with open(files_txt_path, "r") as f:
-            files = f.readlines()
-        for file_line in files:
-            # Use os.path.basename and strip whitespace
-            file_names_list.append(os.path.basename(file_line.strip()))
-    except Exception as e:
-        print(f"Error reading files.txt: {e}")
-    return file_names_list
+    Basenames of the files listed in 'src/files.txt' (shared list, don't modify).
+    """
+    return registry.names()
+
+def sourcePath(name):
+    """
+    Full path of a source file listed in 'src/files.txt', looked up by basename.
+    Returns name unchanged if it isn't listed.
+    """
+    return registry.path(name, name)
 
 def setSelectedFile(file):
     """
@@ -110,6 +222,5 @@ def setCatIDforFile(catID):
     # configMan.save_config()
 
 
-# --- Initial call to config() when Metadata.py is imported ---
-# This ensures configMan and isConfig are set up immediately.
-config()
+# The config is loaded on first use (getConfig()/lazyConfig), not at import
+# time, to keep startup fast.
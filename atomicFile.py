@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+from typing import Optional, Union
+
+"""
+Atomic File - Replace a file's contents without ever leaving it half written
+The data goes to a temporary file in the same folder, which is flushed to
+disk and renamed over the target, so readers see either the old or the new
+contents
+"""
+
+
+def write_atomic(path: str, data: Union[str, bytes], prefix: str = '.tmp-', encoding: Optional[str] = None):
+    """
+    Replace path with data (text or bytes) via a temporary file in the same folder
+
+    The temporary file is removed if anything fails, and an existing file's
+    permissions are kept.
+
+    Args:
+        path: File to replace
+        data: New contents; str is written in text mode with encoding
+        prefix: Name prefix of the temporary file
+        encoding: Text encoding (default: the locale's, as open() uses)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=prefix, suffix='.tmp', dir=directory)
+    try:
+        if isinstance(data, bytes):
+            f = os.fdopen(fd, 'wb')
+        else:
+            f = os.fdopen(fd, 'w', encoding=encoding)
+        with f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
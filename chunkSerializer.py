@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+import re
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+"""
+Chunk Serializer - Precompiled builders for the BWF metadata chunk payloads
+The static parts of the bext, ID3, LIST INFO, iXML and XMP layouts are encoded
+once, so building the chunks for a file only escapes and encodes its values
+"""
+
+SOFTWARE_NAME = 'BWF Metadata Writer'
+
+BEXT_SIZE = 602  # Fixed size for BWF version 0
+
+_UINT32_BE = struct.Struct('>I')
+_UINT32_LE = struct.Struct('<I')
+
+# ID3 text frames: (frame ID, metadata key, default); year frames are added by id3()
+_ID3_TEXT_FRAMES = (
+    ('TIT2', 'Title', ''),          # Title
+    ('TCON', 'Category', ''),       # Genre/Category
+    ('TPE1', 'Designer', ''),       # Artist
+    ('TPE2', 'Library', ''),        # Album Artist
+    ('TOAL', 'Library', ''),        # Original Album
+    ('TPUB', 'URL', ''),            # Publisher
+    ('TIT1', 'URL', ''),            # Content Group
+)
+_ID3_TAIL_FRAMES = (
+    ('TIT3', 'Notes', ''),          # Subtitle
+    ('TOWN', 'Library', ''),        # Owner
+    ('TRCK', 'Source ID', '0'),     # Track
+)
+
+# Steinberg ATTR_LIST names, in output order (all of TYPE string)
+_IXML_ATTR_NAMES = (
+    'MediaLibrary', 'MediaCategoryPost', 'MediaRecordingMethod', 'MediaComment',
+    'MusicalCategory', 'MediaCompany', 'MediaLibraryManufacturerName', 'MediaArtist',
+    'MediaTrackNumber', 'SmfSongName', 'MusicalInstrument',
+)
+
+# iXML USER field names, in output order
+_IXML_USER_FIELDS = (
+    'MICROPHONE', 'LIBRARY', 'CATEGORYFULL', 'DESCRIPTION', 'TRACKTITLE', 'NOTES',
+    'ARTIST', 'TRACKYEAR', 'CATEGORY', 'SOURCE', 'EMBEDDER', 'TRACK', 'KEYWORDS',
+    'URL', 'VOLUME', 'SHOOTDATE', 'SUBCATEGORY', 'MANUFACTURER', 'RATING', 'FXNAME',
+    'CATID', 'RELEASEDATE', 'MICPERSPECTIVE', 'RECORDINGMEDIUM', 'MICCONFIG',
+    'INOUTSIDE', 'LOCATION', 'USERCATEGORY', 'VENDORCATEGORY',
+)
+
+_XMP_TEMPLATE = '''<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="XMP Core 5.5.0">
+   <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+      <rdf:Description rdf:about=""
+            xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+            xmlns:dc="http://purl.org/dc/elements/1.1/"
+            xmlns:xmpDM="http://ns.adobe.com/xmp/1.0/DynamicMedia/">
+         <xmp:CreatorTool>BWF Metadata Writer</xmp:CreatorTool>
+         <xmp:MetadataDate>{datetime}</xmp:MetadataDate>
+         <xmp:ModifyDate>{datetime}</xmp:ModifyDate>
+         <xmp:rating>0.000000</xmp:rating>
+         <dc:description>
+            <rdf:Alt>
+               <rdf:li xml:lang="x-default">{description}</rdf:li>
+               <rdf:li xml:lang="en-US">{description}</rdf:li>
+            </rdf:Alt>
+         </dc:description>
+         <dc:publisher>
+            <rdf:Bag>
+               <rdf:li>{url}</rdf:li>
+            </rdf:Bag>
+         </dc:publisher>
+         <dc:title>
+            <rdf:Alt>
+               <rdf:li xml:lang="x-default">{fx_name}</rdf:li>
+               <rdf:li xml:lang="en-US">{fx_name}</rdf:li>
+            </rdf:Alt>
+         </dc:title>
+         <xmpDM:comment>{notes}</xmpDM:comment>
+         <xmpDM:logComment>{notes}</xmpDM:logComment>
+         <xmpDM:album>{library}</xmpDM:album>
+         <xmpDM:artist>{designer}</xmpDM:artist>
+         <xmpDM:genre>{genre}</xmpDM:genre>
+      </rdf:Description>
+   </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>'''
+
+
+def escape_ixml(value: Any) -> str:
+    """Escape an iXML element value the way the ElementTree based writer laid it out"""
+    text = str(value)
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '\n' in text:
+        # The old indenter stripped every line of the document, including
+        # the lines of multi-line values
+        lines = text.split('\n')
+        text = '\n'.join([lines[0].rstrip()] + [line.strip() for line in lines[1:-1]] + [lines[-1].lstrip()])
+    return text
+
+
+def escape_xmp(text: str) -> str:
+    """Escape an XMP attribute/element value"""
+    if not text:
+        return ''
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&apos;')
+
+
+def _compile_template(template: str) -> Tuple[List[bytes], List[str]]:
+    """Split a {field} template into encoded static segments and the field names between them"""
+    parts = re.split(r'\{(\w+)\}', template)
+    return [part.encode('utf-8') for part in parts[0::2]], parts[1::2]
+
+
+def id3_text_frame(frame_id: bytes, text: str) -> bytes:
+    """ID3v2.3 text frame with UTF-8 encoding (empty text gives no frame)"""
+    if not text:
+        return b''
+    frame_data = text.encode('utf-8', errors='replace')
+    return frame_id + _UINT32_BE.pack(len(frame_data) + 1) + b'\x00\x00\x03' + frame_data
+
+
+def info_subchunk(chunk_id: bytes, text: str) -> bytes:
+    """LIST INFO subchunk with NUL terminated, even padded text (empty text gives no subchunk)"""
+    if not text:
+        return b''
+    text_data = text.encode('utf-8', errors='replace') + b'\x00'
+    if len(text_data) % 2:
+        text_data += b'\x00'  # Pad to even length
+    return chunk_id + _UINT32_LE.pack(len(text_data)) + text_data
+
+
+class BatchContext:
+    """
+    Values shared by every file written in a batch
+
+    All files get the same timestamp, and everything derived from it (date
+    strings, year frames, copyright strings per Manufacturer) is built once.
+    """
+
+    def __init__(self, moment: Optional[datetime] = None):
+        """
+        Args:
+            moment: Timestamp embedded in every file (default: now)
+        """
+        self.moment = moment or datetime.now()
+        self.date = self.moment.strftime('%Y-%m-%d')
+        self.time = self.moment.strftime('%H:%M:%S')
+        self.datetime = self.moment.strftime('%Y-%m-%d %H:%M:%S')
+        self.iso = self.moment.isoformat()
+        self.year = str(self.moment.year)
+
+        # bext with OriginationDate/OriginationTime already filled in
+        bext_template = bytearray(BEXT_SIZE)
+        date_bytes = self.date.encode('ascii')
+        bext_template[320:320+len(date_bytes)] = date_bytes
+        time_bytes = self.time.encode('ascii')
+        bext_template[330:330+len(time_bytes)] = time_bytes
+        self.bext_template = bytes(bext_template)
+
+        self.year_frames = id3_text_frame(b'TYER', self.year) + id3_text_frame(b'TORY', self.year)
+        self.creation_subchunk = info_subchunk(b'ICRD', self.date)
+        self._copyright = {}
+
+    def copyright(self, manufacturer: str) -> Tuple[bytes, bytes, bytes]:
+        """ID3 TCOP frame and LIST ICOP, IARL subchunks for a Manufacturer"""
+        chunks = self._copyright.get(manufacturer)
+        if chunks is None:
+            chunks = (id3_text_frame(b'TCOP', f"{self.year} {manufacturer}"),
+                      info_subchunk(b'ICOP', f"{self.year} {manufacturer}"),
+                      info_subchunk(b'IARL', f"© {self.year} {manufacturer} All Rights Reserved"))
+            self._copyright[manufacturer] = chunks
+        return chunks
+
+
+class ChunkSerializer:
+    """
+    Build chunk payloads from a flat metadata dictionary
+
+    Static segments and field mappings are compiled once in __init__;
+    timestamps and the strings derived from them come from a BatchContext
+    """
+
+    def __init__(self):
+        self._id3_head_frames = [(frame_id.encode('ascii'), key, default) for frame_id, key, default in _ID3_TEXT_FRAMES]
+        self._id3_tail_frames = [(frame_id.encode('ascii'), key, default) for frame_id, key, default in _ID3_TAIL_FRAMES]
+        self._isft_subchunk = info_subchunk(b'ISFT', SOFTWARE_NAME)
+
+        self._ixml_head = b'<BWFXML>\n<IXML_VERSION>1.61</IXML_VERSION>\n<STEINBERG>\n'
+        self._ixml_attr_open = [b'<ATTR>\n<NAME>' + name.encode('ascii') + b'</NAME>\n<TYPE>string</TYPE>\n<VALUE>'
+                                for name in _IXML_ATTR_NAMES]
+        self._ixml_attr_close = b'</VALUE>\n</ATTR>'
+        self._ixml_user_tags = [(b'<' + name.encode('ascii') + b'>', b'</' + name.encode('ascii') + b'>')
+                                for name in _IXML_USER_FIELDS]
+        self._ixml_tail = b'\n</USER>\n</BWFXML>'
+
+        self._xmp_segments, self._xmp_fields = _compile_template(_XMP_TEMPLATE)
+
+    def bext(self, meta: Dict[str, Any], context: BatchContext) -> bytes:
+        """BEXT payload (BWF version 0, 602 bytes)"""
+        # Starts from the batch template: OriginationDate/Time set, TimeReference,
+        # Version, UMID and Reserved zero
+        bext_data = bytearray(context.bext_template)
+
+        # Originator (32 bytes) - use Designer
+        originator = meta.get('Designer', '')[:31].encode('ascii', errors='replace')
+        bext_data[0:len(originator)] = originator
+
+        # OriginatorReference (32 bytes) - use CatID + Source ID
+        ref_bytes = f"{meta.get('CatID', '')}_{meta.get('Source ID', '')}"[:31].encode('ascii', errors='replace')
+        bext_data[32:32+len(ref_bytes)] = ref_bytes
+
+        # Description (256 bytes)
+        desc = meta.get('Description', '')[:255].encode('ascii', errors='replace')
+        bext_data[64:64+len(desc)] = desc
+
+        return bytes(bext_data)
+
+    def id3(self, meta: Dict[str, Any], context: BatchContext) -> bytes:
+        """ID3v2.3 tag with UTF-8 text frames"""
+        copyright_frame = context.copyright(meta.get('Manufacturer', ''))[0]
+        frames = [id3_text_frame(frame_id, meta.get(key, default)) for frame_id, key, default in self._id3_head_frames]
+        frames.append(context.year_frames)
+        frames.append(copyright_frame)
+        frames.extend(id3_text_frame(frame_id, meta.get(key, default)) for frame_id, key, default in self._id3_tail_frames)
+
+        # Comment frame (COMM)
+        description = meta.get('Description', '')
+        if description:
+            comm_data = b'\x03eng\x00' + description.encode('utf-8', errors='replace')
+            frames.append(b'COMM' + _UINT32_BE.pack(len(comm_data)) + b'\x00\x00' + comm_data)
+
+        frames_data = b''.join(frames)
+
+        # ID3v2 header with syncsafe size
+        id3_size = len(frames_data)
+        syncsafe_size = ((id3_size & 0x0FE00000) << 3) | ((id3_size & 0x001FC000) << 2) | ((id3_size & 0x00003F80) << 1) | (id3_size & 0x0000007F)
+        return b'ID3\x03\x00\x00' + _UINT32_BE.pack(syncsafe_size) + frames_data
+
+    def list_info(self, meta: Dict[str, Any], filename: str, context: BatchContext) -> bytes:
+        """Complete LIST chunk (header included) of form INFO"""
+        _, copyright_subchunk, archival_subchunk = context.copyright(meta.get('Manufacturer', ''))
+        info_data = b''.join((
+            b'INFO',
+            self._isft_subchunk,                                    # Software
+            info_subchunk(b'INAM', filename),                       # Name
+            context.creation_subchunk,                              # Creation date
+            info_subchunk(b'IPRD', meta.get('Library', '')),        # Product
+            info_subchunk(b'IGNR', meta.get('Category', '')),       # Genre
+            copyright_subchunk,                                     # Copyright
+            info_subchunk(b'ICMT', meta.get('Description', '')),    # Comment
+            archival_subchunk,                                      # Archival location
+            info_subchunk(b'IART', meta.get('Designer', '')),       # Artist
+        ))
+        return b'LIST' + _UINT32_LE.pack(len(info_data)) + info_data
+
+    def ixml(self, meta: Dict[str, Any], filename: str, context: BatchContext) -> bytes:
+        """iXML document with Steinberg and USER sections"""
+        subcategory = meta.get('SubCategory', '') or meta.get('Subcategory', '')
+        category = meta.get('Category', '')
+        category_full = f"{category}-{subcategory}" if category and subcategory else category or subcategory
+
+        attr_values = (
+            meta.get('Library', ''),
+            category,
+            meta.get('Microphone', ''),
+            meta.get('Description', ''),
+            meta.get('SubCategory', ''),
+            meta.get('URL', ''),
+            meta.get('Manufacturer', ''),
+            meta.get('Designer', ''),
+            meta.get('Source ID', '0'),
+            filename,
+            filename,
+        )
+        user_values = (
+            meta.get('Microphone', ''),
+            meta.get('Library', ''),
+            category_full,
+            meta.get('Description', ''),
+            meta.get('TrackTitle', '') or filename,
+            meta.get('Notes', ''),
+            meta.get('Designer', ''),
+            context.year,
+            category,
+            meta.get('URL', ''),
+            SOFTWARE_NAME,
+            meta.get('Source ID', '0'),
+            meta.get('Keywords', '') or filename,
+            meta.get('URL', ''),
+            meta.get('URL', ''),
+            context.datetime,
+            subcategory,
+            meta.get('Manufacturer', ''),
+            '0',
+            meta.get('FX Name', ''),
+            meta.get('CatID', '') or meta.get('CatId', ''),
+            context.date,
+            meta.get('Microphone Perspective', '') or meta.get('MicPerspective', ''),
+            meta.get('Recording Medium', '') or meta.get('RecMedium', ''),
+            meta.get('Microphone Configuration', ''),
+            meta.get('Inside or Outside', ''),
+            meta.get('Location', ''),
+            meta.get('User Category', ''),
+            meta.get('Vendor Category', ''),
+        )
+
+        # Only non-empty values are written, one element per line
+        attrs = [attr_open + escape_ixml(value).encode('utf-8') + self._ixml_attr_close
+                 for attr_open, value in zip(self._ixml_attr_open, attr_values) if value]
+        fields = [open_tag + escape_ixml(value).encode('utf-8') + close_tag
+                  for (open_tag, close_tag), value in zip(self._ixml_user_tags, user_values) if value]
+
+        attr_list = b'<ATTR_LIST>\n' + b'\n'.join(attrs) + b'\n</ATTR_LIST>' if attrs else b'<ATTR_LIST />'
+        return b''.join((self._ixml_head, attr_list, b'\n</STEINBERG>\n<USER>\n', b'\n'.join(fields), self._ixml_tail))
+
+    def xmp(self, meta: Dict[str, Any], context: BatchContext) -> bytes:
+        """XMP packet for the _PMX chunk"""
+        category = meta.get('Category', '')
+        subcategory = meta.get('SubCategory', '')
+        values = {
+            'datetime': context.iso,
+            'description': escape_xmp(meta.get('Description', '')),
+            'url': escape_xmp(meta.get('URL', '')),
+            'fx_name': escape_xmp(meta.get('FX Name', '')),
+            'notes': escape_xmp(meta.get('Notes', '')),
+            'library': escape_xmp(meta.get('Library', '')),
+            'designer': escape_xmp(meta.get('Designer', '')),
+            'genre': escape_xmp(f"{category}-{subcategory}" if category and subcategory else category or subcategory),
+        }
+        encoded = {name: value.encode('utf-8') for name, value in values.items()}
+
+        parts = [self._xmp_segments[0]]
+        for name, segment in zip(self._xmp_fields, self._xmp_segments[1:]):
+            parts.append(encoded[name])
+            parts.append(segment)
+        return b''.join(parts)
@@ -1,11 +1,189 @@
+import atexit
 import configparser
+import hashlib
+import io
 import os
-from pathlib import Path
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from atomicFile import write_atomic
+
+# Seconds to wait after a change before writing config.ini, so bursts of
+# changes (keystrokes, apply-to-all loops) become a single save
+DEFAULT_FLUSH_DELAY = 1.0
+
+# File sections are stored sparsely: a value is looked up in the file's own
+# section, then in its batch's defaults section, then in the template
+FILE_TEMPLATES = ('Basic File', 'Advanced File')
+
+# Batch defaults sections are named '<BATCH_DEFAULTS><batch id>' ('_adv' added
+# for Advanced File values); a file section names its batch under BATCH_KEY
+BATCH_DEFAULTS = 'Batch Defaults:'
+BATCH_KEY = 'batch'
+
+# Config key -> embedded metadata field name
+METADATA_TRANSLATE = {
+    'CatID': 'CatID',
+    'Category': 'CategoryFull',
+    'SubCategory': 'SubCategory',
+    'FX Name': 'FXName',
+    'User Category': 'UserCategory',
+    'Vendor Category': 'VendorCategory',
+    'Description': 'Description',
+    'Title': 'TrackTitle',
+    'Keywords': 'Keywords',
+    'Designer': 'Designer',
+    'Microphone': 'Microphone',
+    'Recording Medium': 'RecMedium',
+    'Microphone Configuration': 'RecType',
+    'Microphone Perspective': 'MicPerspective',
+    'Inside or Outside': 'MicPerspective',
+    'Library': 'Library',
+    'URL': 'URL',
+    'Manufacturer': 'Manufacturer',
+    'Location': 'Location',
+    'Notes': 'Notes'
+}
+
+# Field names of a FileMetadata record, and (lower case config key, field) pairs
+# in the order they're resolved; for fields fed by two keys the later non-empty one wins
+METADATA_FIELDS = tuple(dict.fromkeys(METADATA_TRANSLATE.values()))
+METADATA_SOURCES = tuple((key.lower(), field) for key, field in METADATA_TRANSLATE.items())
+
+
+def batch_id(files):
+    """Batch a set of files belongs to when values are applied to all of them at once"""
+    names = '\n'.join(sorted(set(files)))
+    return hashlib.sha1(names.encode('utf-8')).hexdigest()[:12]
+
+
+class FileMetadata:
+    """
+    Embedded metadata of one file as a slotted record
+
+    Behaves like a read-mostly {field: value} dict. Empty fields are left
+    unset, which the writer treats the same as an empty string.
+    """
+    __slots__ = METADATA_FIELDS
+
+    def __getitem__(self, field):
+        if field in METADATA_FIELDS:
+            try:
+                return getattr(self, field)
+            except AttributeError:
+                pass
+        raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        if field not in METADATA_FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return field in METADATA_FIELDS and hasattr(self, field)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [field for field in METADATA_FIELDS if hasattr(self, field)]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.keys()]
+
+    def __repr__(self):
+        return f"FileMetadata({dict(self.items())!r})"
+
+
+class MetadataView(Mapping):
+    """
+    {file: FileMetadata} view of a ConfigManager's file sections
+
+    A file's record is translated from its resolved <file> and <file>_adv
+    sections the first time it's read, so it's available straight after
+    loading, and dropped when either section (or its batch defaults) changes.
+    """
+
+    def __init__(self, manager):
+        self._manager = manager
+        self._records = {}
+
+    def __getitem__(self, file):
+        with self._manager._lock:
+            record = self._records.get(file)
+            if record is None:
+                record = self._build(file)
+                self._records[file] = record
+            return record
+
+    def __iter__(self):
+        manager = self._manager
+        files = {}
+        for section in manager.list_sections():
+            template = manager._file_template(section)
+            if template == 'Advanced File' and section.endswith('_adv'):
+                files[section[:-4]] = None
+            elif template == 'Basic File':
+                files[section] = None
+        return iter(files)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def _build(self, file):
+        manager = self._manager
+        views = []
+        for section, template in ((file, 'Basic File'), (file + '_adv', 'Advanced File')):
+            if manager._file_template(section) == template:
+                view = manager.resolved(section)
+                if view is not None:
+                    views.append(view)
+        if not views:
+            raise KeyError(file)
+
+        record = FileMetadata()
+        for key, field in METADATA_SOURCES:
+            for view in views:
+                value = view.get(key)
+                if value:
+                    setattr(record, field, value)
+        return record
+
+    def invalidate(self, file=None):
+        """Drop one file's record, or all of them (file=None)"""
+        if file is None:
+            self._records.clear()
+        else:
+            self._records.pop(file, None)
+
 
 class ConfigManager:
-    def __init__(self, config_file="config.ini"):
+    def __init__(self, config_file="config.ini", flush_delay=DEFAULT_FLUSH_DELAY):
+        """
+        Args:
+            config_file: Path of the ini file
+            flush_delay: Seconds changes are held before they are written (write-behind)
+        """
         self.config_file = config_file
         self.config = configparser.ConfigParser()
+        self.flush_delay = flush_delay
+        
+        # Write-behind state: changes mark the config dirty and a timer writes it later
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        atexit.register(self.commit)
         
         # Define default templates for different section types
         self.section_templates = {
@@ -13,7 +191,12 @@ class ConfigManager:
                 'Selected File': '',
                 'Output Directory': '',
                 'UCS Cat': 'False',
-                'UCS List': 'False'
+                'UCS List': 'False',
+                'Export Workers': '4',
+                'Export Pool': 'thread',
+                'Incremental Export': 'True',
+                'Hash Sources': 'False',
+                'Reserve Size': '4096'
             },
             'Basic File': {
                 'CatID': '',
@@ -43,37 +226,22 @@ class ConfigManager:
             }
         }
         
-        self.metadataTranslate = {
-            'CatID': 'CatID',
-            'Category': 'CategoryFull',
-            'SubCategory': 'SubCategory',
-            'FX Name': 'FXName',
-            'User Category': 'UserCategory',
-            'Vendor Category': 'VendorCategory',
-            'Description': 'Description',
-            'Title': 'TrackTitle',
-            'Keywords': 'Keywords',
-            'Designer': 'Designer',
-            'Microphone': 'Microphone',
-            'Recording Medium': 'RecMedium',
-            'Microphone Configuration': 'RecType',
-            'Microphone Perspective': 'MicPerspective',
-            'Inside or Outside': 'MicPerspective',
-            'Library': 'Library',
-            'URL': 'URL',
-            'Manufacturer': 'Manufacturer',
-            'Location': 'Location',
-            'Notes': 'Notes'
-        }
+        self.metadataTranslate = METADATA_TRANSLATE
+        
+        # Embedded metadata per file, translated from the config on demand
+        self.metadata = MetadataView(self)
         
-        self.metadata = {}
+        # Sections that hold settings rather than a file's metadata
+        self.settings_sections = {'USER'}
+        
+        # Memoized resolved views: section -> {key: value}
+        self._resolved = {}
         
         self.load_config()
         
     def setMetadata(self, file, id, value):
         # id = f'USER:{id}'
-        if file not in self.metadata:
-            self.metadata[file] = {}
+        # Only lasts until the file's sections change; use set_value to persist
         self.metadata[file][id] = value
     
     def load_config(self):
@@ -90,12 +258,15 @@ class ConfigManager:
         # Add default sections
         # self.add_section('UI')
         # self.add_section('FileSettings')
-        self.save_config()
+        self.save_config(immediate=True)
     
     def add_section(self, section_name, template_type=None):
         """
         Add a new section with default template values
         
+        File sections ('Basic File', 'Advanced File') are created empty; their
+        values are inherited until set (see resolved()).
+        
         Args:
             section_name: Name of the section to add
             template_type: Type of template to use (defaults to section_name)
@@ -112,15 +283,23 @@ class ConfigManager:
             return False
         
         # Add section with template values
-        self.config.add_section(section_name)
-        template = self.section_templates[template_type]
-        
-        for key, value in template.items():
-            self.config.set(section_name, key, value)
+        with self._lock:
+            self._create_section(section_name, template_type)
+            self._mark_dirty()
         
         print(f"Added section '{section_name}' with template '{template_type}'")
         return True
     
+    def _create_section(self, section_name, template_type):
+        """Add a section from a template (caller holds the lock and checks it's new)"""
+        self.config.add_section(section_name)
+        self._invalidate(section_name)
+        if template_type in FILE_TEMPLATES:
+            return
+        self.settings_sections.add(section_name)
+        for key, value in self.section_templates[template_type].items():
+            self.config.set(section_name, key, value)
+    
     def section_exists(self, section_name) -> bool:
         if section_name in self.config.sections():
             return True
@@ -139,21 +318,97 @@ class ConfigManager:
             print(f"Section '{section_name}' already exists!")
             return False
         
-        self.config.add_section(section_name)
-        
-        if custom_defaults:
-            for key, value in custom_defaults.items():
-                self.config.set(section_name, key, str(value))
+        with self._lock:
+            self.config.add_section(section_name)
+            self.settings_sections.add(section_name)
+            self._invalidate(section_name)
+            
+            if custom_defaults:
+                for key, value in custom_defaults.items():
+                    self.config.set(section_name, key, str(value))
+            self._mark_dirty()
         
         print(f"Added custom section '{section_name}'")
         return True
     
     def get_value(self, section, key, fallback=None):
-        """Get a value from config with fallback"""
-        try:
-            return self.config.get(section, key)
-        except (configparser.NoSectionError, configparser.NoOptionError):
+        """Get a value from config with fallback (file sections resolve inherited values)"""
+        view = self.resolved(section)
+        if view is None:
             return fallback
+        return view.get(key.lower(), fallback)
+    
+    def get_user_value(self, section, key, fallback=None):
+        """Get a value set for the section itself or applied to its batch, ignoring template defaults"""
+        with self._lock:
+            own = self._own_items(section)
+            if own is None:
+                return fallback
+            if key.lower() in own:
+                return own[key.lower()]
+            return self._batch_items(section, own).get(key.lower(), fallback)
+    
+    def resolved(self, section):
+        """
+        Resolved {key: value} view of a section (keys lower case), or None if
+        the section doesn't exist
+        
+        For a file section the layers are, lowest first: its template, the
+        defaults of the batch it was last applied to together with (see
+        set_defaults) and the section's own values. Views are memoized until a
+        layer changes; treat them as read-only.
+        """
+        with self._lock:
+            cached = self._resolved.get(section)
+            if cached is not None:
+                return cached
+            
+            own = self._own_items(section)
+            if own is None:
+                return None
+            template = self._file_template(section)
+            if template is None:
+                view = own
+            else:
+                view = {key.lower(): value for key, value in self.section_templates[template].items()}
+                view.update(self._batch_items(section, own))
+                view.update(own)
+            self._resolved[section] = view
+            return view
+    
+    def _own_items(self, section):
+        """Values stored in the section itself (keys lower case), or None if it doesn't exist"""
+        try:
+            return dict(self.config.items(section))
+        except configparser.NoSectionError:
+            return None
+    
+    def _file_template(self, section):
+        """Template a file section inherits from, or None for settings sections"""
+        if section in self.settings_sections or section.startswith(BATCH_DEFAULTS):
+            return None
+        return 'Advanced File' if section.endswith('_adv') else 'Basic File'
+    
+    def _defaults_section(self, batch, template_type):
+        """Defaults section of a batch for the template's keys"""
+        return BATCH_DEFAULTS + batch + ('_adv' if template_type == 'Advanced File' else '')
+    
+    def _batch_items(self, section, own):
+        """Defaults of the batch named in a file section's own values ({} if none)"""
+        batch = own.get(BATCH_KEY)
+        template = self._file_template(section)
+        if not batch or template is None:
+            return {}
+        return self._own_items(self._defaults_section(batch, template)) or {}
+    
+    def _invalidate(self, section=None):
+        """Drop memoized views: one section's, or all of them (section=None)"""
+        if section is None or section.startswith(BATCH_DEFAULTS):
+            self._resolved.clear()
+            self.metadata.invalidate()
+        else:
+            self._resolved.pop(section, None)
+            self.metadata.invalidate(section[:-4] if section.endswith('_adv') else section)
     
     def set_value(self, section: str, key, value):
         """Set a value in config"""
@@ -162,36 +417,211 @@ class ConfigManager:
             # self.add_section(section)
         
         
-        self.config.set(section, key, str(value))
-        if section.endswith('_adv'):
-            file = section[:-4]
-        else:
-            file = section
-        if key in self.metadataTranslate.keys():
-            self.setMetadata(file, self.metadataTranslate[key], value)
+        with self._lock:
+            self.config.set(section, key, str(value))
+            self._invalidate(section)
+            self._mark_dirty()
+    
+    def set_many(self, sections, values, template_type=None):
+        """
+        Set the same keys in many sections, with a single save
+        
+        Args:
+            sections: Section names
+            values: {key: value}. A list or tuple value gives one value per
+                section, in the order of sections
+            template_type: Template the keys must belong to (checked once, and
+                matched case-insensitively to the template's spelling); missing
+                sections are created from it. Without it keys are not checked
+                and every section must exist
+        
+        Raises:
+            KeyError: A key is not part of template_type
+            ValueError: A per-section value list has the wrong length
+            configparser.NoSectionError: A section is missing and there is no template
+        """
+        sections = list(sections)
+        updates = self._prepare_many(sections, values, template_type)
+        
+        with self._lock:
+            missing = [section for section in sections if section not in self.config]
+            if missing and template_type is None:
+                raise configparser.NoSectionError(missing[0])
+            for section in missing:
+                self._create_section(section, template_type)
+            for key, column in updates:
+                for section, value in zip(sections, column):
+                    self.config.set(section, key, value)
+            self._invalidate()
+            self._mark_dirty()
+        
+        self._report_many(sections, updates, len(missing))
+    
+    def set_defaults(self, sections, values, template_type, batch):
+        """
+        Give a batch of file sections the same values by storing them once in
+        the batch's defaults section
+        
+        Missing sections are created (empty) and tagged with the batch, and any
+        override of these keys in them is removed so they inherit the new
+        value. A section that was tagged with another batch first gets that
+        batch's values copied onto it, so moving it loses nothing. Sections
+        outside the batch are not affected.
         
+        Args:
+            sections: File section names
+            values: {key: value}, one value per key
+            template_type: 'Basic File' or 'Advanced File'
+            batch: Batch id (see batch_id)
+        """
+        sections = list(sections)
+        if any(isinstance(value, (list, tuple)) for value in values.values()):
+            raise ValueError("Batch defaults take a single value per key")
+        updates = self._prepare_many(sections, values, template_type)
+        defaults = self._defaults_section(batch, template_type)
+        
+        with self._lock:
+            if not self.config.has_section(defaults):
+                self.config.add_section(defaults)
+            missing = [section for section in sections if not self.config.has_section(section)]
+            for section in missing:
+                self._create_section(section, template_type)
+            for section in sections:
+                own = self._own_items(section)
+                if own.get(BATCH_KEY) != batch:
+                    for key, value in self._batch_items(section, own).items():
+                        if key not in own:
+                            self.config.set(section, key, value)
+                    self.config.set(section, BATCH_KEY, batch)
+            for key, column in updates:
+                self.config.set(defaults, key, column[0])
+                for section in sections:
+                    self.config.remove_option(section, key)
+            self._invalidate()
+            self._mark_dirty()
+        
+        self._report_many(sections, updates, len(missing))
+    
+    def apply_to_all(self, files, values, advanced=False):
+        """
+        Set values for every file in one bulk update
+        
+        Single values are stored once, as defaults of the batch made of
+        exactly these files (see set_defaults); per-file value lists are
+        written to each file (see set_many).
+        
+        Args:
+            files: File names (as in files.txt, without the _adv suffix)
+            values: {key: value}, see set_many
+            advanced: Write to the <file>_adv ('Advanced File') sections instead
+                of the <file> ('Basic File') sections
+        """
+        files = list(files)
+        template_type = 'Advanced File' if advanced else 'Basic File'
+        sections = [file + '_adv' for file in files] if advanced else files
+        shared = {key: value for key, value in values.items() if not isinstance(value, (list, tuple))}
+        per_file = {key: value for key, value in values.items() if isinstance(value, (list, tuple))}
+        if per_file:
+            self.set_many(sections, per_file, template_type)
+        if shared:
+            self.set_defaults(sections, shared, template_type, batch_id(files))
+    
+    def _prepare_many(self, sections, values, template_type):
+        """Validate set_many keys once and expand values to one string per section"""
+        if template_type is not None:
+            if template_type not in self.section_templates:
+                raise KeyError(f"Template '{template_type}' not found")
+            spelling = {key.lower(): key for key in self.section_templates[template_type]}
+        
+        updates = []
+        for key, value in values.items():
+            if template_type is not None:
+                if key.lower() not in spelling:
+                    raise KeyError(f"'{key}' is not a '{template_type}' setting")
+                key = spelling[key.lower()]
+            if isinstance(value, (list, tuple)):
+                if len(value) != len(sections):
+                    raise ValueError(f"Expected {len(sections)} values for '{key}', got {len(value)}")
+                column = [str(v) for v in value]
+            else:
+                column = [str(value)] * len(sections)
+            updates.append((key, column))
+        return updates
+    
+    def _report_many(self, sections, updates, created):
+        keys = ', '.join(key for key, _ in updates)
+        message = f"Set {keys} for {len(sections)} sections"
+        if created:
+            message += f" ({created} created)"
+        print(message)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group a bulk update
+        
+        Other threads (the write-behind timer included) wait until the block
+        ends, and the changes are saved together afterwards.
+        """
+        with self._lock:
+            yield self
         self.save_config()
     
-    def save_config(self):
-        """Save configuration to file"""
-        try:
-            with open(self.config_file, 'w') as configfile:
-                self.config.write(configfile)
-            print(f"Configuration saved to {self.config_file}")
-        except Exception as e:
-            print(f"Error saving config: {e}")
+    def save_config(self, immediate=False):
+        """
+        Save configuration to file
+        
+        Saves are write-behind: the config is marked dirty and written once
+        flush_delay seconds later, together with any other changes made in the
+        meantime. Pass immediate=True (or call commit()) to write now.
+        """
+        self._mark_dirty()
+        if immediate:
+            self.commit()
+    
+    def commit(self):
+        """Write pending changes to the config file now (no-op if nothing changed)"""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                # Snapshot under the lock so the file always holds a consistent state
+                buffer = io.StringIO()
+                self.config.write(buffer)
+                self._dirty = False
+            
+            try:
+                write_atomic(self.config_file, buffer.getvalue(), prefix='.config-')
+                print(f"Configuration saved to {self.config_file}")
+            except Exception as e:
+                print(f"Error saving config: {e}")
+                # Retried by the next change or on exit
+                with self._lock:
+                    self._dirty = True
+    
+    def _mark_dirty(self):
+        """Record a change and make sure a flush is scheduled"""
+        with self._lock:
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.commit)
+                self._timer.daemon = True
+                self._timer.start()
     
     def list_sections(self):
         """List all sections in config"""
         return self.config.sections()
     
     def list_section_items(self, section):
-        """List all items in a section"""
-        try:
-            return dict(self.config.items(section))
-        except configparser.NoSectionError:
+        """List all items in a section (for file sections, including inherited values)"""
+        view = self.resolved(section)
+        if view is None:
             print(f"Section '{section}' not found")
             return {}
+        return dict(view)
     
     # def add_template(self, template_name, template_dict):
     #     """Add a new template type"""
@@ -204,7 +634,12 @@ class ConfigManager:
     
     def remove_section(self, section_name):
         """Remove a section from config"""
-        if self.config.remove_section(section_name):
+        with self._lock:
+            removed = self.config.remove_section(section_name)
+            if removed:
+                self._invalidate(section_name)
+                self._mark_dirty()
+        if removed:
             print(f"Removed section '{section_name}'")
             return True
         else:
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from atomicFile import write_atomic
+from chunkSerializer import BatchContext
+from ixml import BWFMetadataWriter, DEFAULT_RESERVE_SIZE
+
+"""
+Batch Export Engine - Copy and embed metadata for many files concurrently
+Runs exports on a thread or process pool and streams progress back through a
+queue so a Tk UI can poll it without blocking the main loop. With an
+ExportManifest, files that are unchanged since the last export are skipped,
+and files whose metadata is all that changed get it rewritten in place
+"""
+
+DEFAULT_WORKERS = 4
+
+# Bump when the writer's output changes so every destination is re-exported
+MANIFEST_VERSION = 1
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ExportJob(NamedTuple):
+    """One file to export"""
+    source: str
+    destination: str
+    metadata: Dict[str, Any]
+
+
+class ExportResult(NamedTuple):
+    """Outcome of one export job"""
+    job: ExportJob
+    ok: bool
+    error: Optional[str]
+    seconds: float
+    skipped: bool = False                   # Destination was already up to date
+    updated: bool = False                   # Only the destination's metadata was rewritten
+    entry: Optional[Dict[str, Any]] = None  # Manifest entry for the destination
+
+
+class ExportSummary(NamedTuple):
+    """Outcome of a whole batch"""
+    total: int
+    succeeded: int
+    failed: List[ExportResult]
+    cancelled: int
+    seconds: float
+    skipped: int = 0
+
+
+def metadata_hash(metadata: Dict[str, Any]) -> str:
+    """Stable hash of a resolved metadata dictionary"""
+    encoded = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_identity(path: str) -> Tuple[int, int]:
+    """(size, mtime in ns) of a file"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class ExportManifest:
+    """
+    Persisted record of how every destination was produced
+
+    Entries are keyed by destination path and hold the source identity (size,
+    mtime, optional content hash), the metadata hash and the destination
+    identity written at export time. A job whose entry still matches can be
+    skipped.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: JSON file the manifest is loaded from and saved to
+        """
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable export manifest {path}: {e}")
+            return
+        if isinstance(data, dict) and data.get('version') == MANIFEST_VERSION:
+            self.entries = data.get('entries', {})
+
+    def get(self, destination: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.entries.get(os.path.abspath(destination))
+
+    def update(self, destination: str, entry: Dict[str, Any]):
+        with self._lock:
+            self.entries[os.path.abspath(destination)] = entry
+
+    def remove(self, destination: str):
+        with self._lock:
+            self.entries.pop(os.path.abspath(destination), None)
+
+    def save(self):
+        """Write the manifest atomically (see atomicFile.write_atomic)"""
+        with self._lock:
+            data = {'version': MANIFEST_VERSION, 'entries': dict(self.entries)}
+        write_atomic(self.path, json.dumps(data, ensure_ascii=False), prefix='.manifest-', encoding='utf-8')
+
+
+def manifest_entry(job: ExportJob, hash_source: bool = False, source_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Manifest entry for a destination that was just written from job"""
+    source_size, source_mtime = file_identity(job.source)
+    destination_size, destination_mtime = file_identity(job.destination)
+    if hash_source and source_hash is None:
+        source_hash = file_hash(job.source)
+    return {
+        'source': os.path.abspath(job.source),
+        'source_size': source_size,
+        'source_mtime_ns': source_mtime,
+        'source_hash': source_hash,
+        'metadata_hash': metadata_hash(job.metadata),
+        'destination_size': destination_size,
+        'destination_mtime_ns': destination_mtime,
+    }
+
+
+def check_unchanged(job: ExportJob, entry: Optional[Dict[str, Any]], hash_source: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Compare a job with the manifest entry of its destination
+
+    Returns:
+        The (refreshed) entry if the destination is up to date, otherwise None
+    """
+    if not entry or entry.get('metadata_hash') != metadata_hash(job.metadata):
+        return None
+    return check_files_unchanged(job, entry, hash_source)
+
+
+def check_files_unchanged(job: ExportJob, entry: Optional[Dict[str, Any]], hash_source: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Compare a job's source and destination files (not its metadata) with the
+    manifest entry of its destination
+
+    The source matches if its size and mtime are unchanged, or (with
+    hash_source) if only its mtime changed but the content hash is the same.
+
+    Returns:
+        The (refreshed) entry if both files are as the entry recorded, otherwise None
+    """
+    if not entry or entry.get('source') != os.path.abspath(job.source):
+        return None
+    try:
+        destination = file_identity(job.destination)
+        source_size, source_mtime = file_identity(job.source)
+    except OSError:
+        return None
+    if destination != (entry.get('destination_size'), entry.get('destination_mtime_ns')):
+        return None
+    if source_size != entry.get('source_size'):
+        return None
+    if source_mtime == entry.get('source_mtime_ns'):
+        return entry
+    if hash_source and entry.get('source_hash') and file_hash(job.source) == entry['source_hash']:
+        # Touched but identical; remember the new mtime so the next check is cheap
+        return dict(entry, source_mtime_ns=source_mtime)
+    return None
+
+
+def describe_error(error: BaseException, job: ExportJob) -> str:
+    """User facing message for an export failure"""
+    if isinstance(error, FileNotFoundError):
+        if not os.path.exists(job.source):
+            return f'Source File {job.source} not found.'
+        return f'Destination folder for {job.destination} not found.'
+    if isinstance(error, PermissionError):
+        return f'Permission was denied when trying to create {job.destination}.'
+    return f'An unexpected error occurred with {job.source}: {error}'
+
+
+def export_file(job: ExportJob, context: Optional[BatchContext] = None, previous: Optional[Dict[str, Any]] = None,
+                incremental: bool = False, hash_source: bool = False,
+                reserve_size: int = DEFAULT_RESERVE_SIZE) -> ExportResult:
+    """
+    Copy job.source to job.destination with metadata embedded (runs in a worker)
+
+    Args:
+        job: File to export
+        context: Batch values shared with the other files
+        previous: Manifest entry of job.destination from an earlier export
+        incremental: Skip the job if previous shows the destination is up to
+            date, rewrite only the destination's metadata if that is all that
+            changed, and return a manifest entry for what was written
+        hash_source: Also use source content hashes in the manifest
+        reserve_size: Bytes of padding left after the metadata (see BWFMetadataWriter)
+    """
+    start = time.perf_counter()
+    try:
+        unchanged = check_files_unchanged(job, previous, hash_source) if incremental else None
+        if unchanged is not None and unchanged.get('metadata_hash') == metadata_hash(job.metadata):
+            return ExportResult(job, True, None, time.perf_counter() - start, skipped=True, entry=unchanged)
+        if unchanged is not None:
+            # The destination already holds the source's audio; rewrite its metadata
+            # (in place when it fits the reserve) instead of copying the audio again
+            BWFMetadataWriter(job.destination, job.metadata, reserve_size=reserve_size, context=context)
+            entry = manifest_entry(job, hash_source, unchanged.get('source_hash'))
+            return ExportResult(job, True, None, time.perf_counter() - start, updated=True, entry=entry)
+        BWFMetadataWriter(job.destination, job.metadata, source_filepath=job.source, reserve_size=reserve_size,
+                          context=context)
+        entry = manifest_entry(job, hash_source) if incremental else None
+    except Exception as e:
+        return ExportResult(job, False, describe_error(e, job), time.perf_counter() - start)
+    return ExportResult(job, True, None, time.perf_counter() - start, entry=entry)
+
+
+class BatchExporter:
+    """
+    Export a batch of files on a worker pool
+
+    Progress is reported as events on self.events:
+        ('result', ExportResult, done_count, total)  after every finished job
+        ('finished', ExportSummary)                   once, when the batch ends
+    """
+
+    def __init__(self, jobs: List[ExportJob], max_workers: int = DEFAULT_WORKERS, use_processes: bool = False,
+                 manifest: Optional[ExportManifest] = None, hash_sources: bool = False,
+                 reserve_size: int = DEFAULT_RESERVE_SIZE):
+        """
+        Args:
+            jobs: Files to export
+            max_workers: Size of the worker pool
+            use_processes: Use a process pool instead of a thread pool
+            manifest: Enables incremental export: jobs whose source, metadata and
+                destination are unchanged since the last export are skipped, and
+                the manifest is updated and saved when the batch ends
+            hash_sources: Compare source content hashes when only the mtime changed
+            reserve_size: Bytes of padding left after each file's metadata so
+                later metadata-only exports fit in place
+        """
+        self.jobs = list(jobs)
+        self.max_workers = max(1, max_workers)
+        self.use_processes = use_processes
+        self.manifest = manifest
+        self.hash_sources = hash_sources
+        self.reserve_size = reserve_size
+        self.events = queue.Queue()
+        self.start_time = None
+        self.context = None
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start exporting in the background"""
+        self.start_time = time.perf_counter()
+        # Every file of the batch gets the same timestamp
+        self.context = BatchContext()
+        self._thread = threading.Thread(target=self._run, name='BatchExporter', daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Stop after the jobs that are already running; queued jobs are dropped"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def poll(self) -> list:
+        """Return all events posted since the last poll without blocking"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _run(self):
+        """
+        Submit jobs (bounded so cancel takes effect quickly) and collect results
+
+        'finished' is always posted, even if the pool breaks or the manifest
+        can't be read or saved: jobs that can't be submitted fail with the error.
+        """
+        total = len(self.jobs)
+        done = 0
+        failed = []
+        skipped = 0
+        pending = {}  # future -> job
+        next_job = 0
+        pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+
+        def record(result):
+            nonlocal done, skipped
+            done += 1
+            if not result.ok:
+                failed.append(result)
+            elif result.skipped:
+                skipped += 1
+            if self.manifest is not None:
+                if result.entry is not None:
+                    self.manifest.update(result.job.destination, result.entry)
+                elif not result.ok:
+                    self.manifest.remove(result.job.destination)
+            self.events.put(('result', result, done, total))
+
+        def fail(jobs, error):
+            for job in jobs:
+                record(ExportResult(job, False, describe_error(error, job), 0.0))
+
+        try:
+            with pool_class(max_workers=self.max_workers) as pool:
+                while next_job < total or pending:
+                    # Keep a couple of jobs per worker in flight
+                    while not self.cancelled and next_job < total and len(pending) < self.max_workers * 2:
+                        job = self.jobs[next_job]
+                        try:
+                            previous = self.manifest.get(job.destination) if self.manifest is not None else None
+                            future = pool.submit(export_file, job, self.context, previous,
+                                                 self.manifest is not None, self.hash_sources, self.reserve_size)
+                        except Exception as e:  # e.g. a broken process pool
+                            fail(self.jobs[next_job:], e)
+                            next_job = total
+                            break
+                        pending[future] = job
+                        next_job += 1
+                    if not pending:
+                        break
+
+                    finished, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        job = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:  # e.g. a broken process pool
+                            result = ExportResult(job, False, describe_error(e, job), 0.0)
+                        record(result)
+        except Exception as e:
+            fail(list(pending.values()) + self.jobs[next_job:], e)
+        finally:
+            if self.manifest is not None:
+                try:
+                    self.manifest.save()
+                except Exception as e:
+                    print(f"Error saving export manifest: {e}")
+
+            summary = ExportSummary(total=total,
+                                    succeeded=done - len(failed) - skipped,
+                                    failed=failed,
+                                    cancelled=total - done,
+                                    seconds=time.perf_counter() - self.start_time,
+                                    skipped=skipped)
+            self.events.put(('finished', summary))
+
+    def eta(self, done: int) -> Optional[float]:
+        """Estimated seconds remaining after done of len(self.jobs) jobs"""
+        if not done or self.start_time is None:
+            return None
+        elapsed = time.perf_counter() - self.start_time
+        return elapsed / done * (len(self.jobs) - done)
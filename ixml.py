@@ -5,39 +5,135 @@ import os
 import sys
 import argparse
 import configparser
-import xml.etree.ElementTree as ET
+import errno
+import shutil
+import tempfile
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from riffIndex import RiffIndex, DS64_CHUNK_ID, MAX_RIFF_SIZE
+from chunkSerializer import BatchContext, ChunkSerializer
 
 """
 BWF Metadata Writer - Write comprehensive BWF metadata to WAVE files
 Reads metadata from dictionaries and writes to BEXT, ID3, LIST INFO, iXML, and XMP chunks
 """
 
+# Chunk IDs written (and replaced) by this writer
+METADATA_CHUNK_IDS = (b'bext', b'ID3 ', b'LIST', b'iXML', b'_PMX')
+
+# Filler chunk used to reserve room for metadata growth
+PADDING_CHUNK_ID = b'JUNK'
+
+# Default number of padding bytes reserved after the metadata chunks so later
+# edits can be written in place without moving the audio data
+DEFAULT_RESERVE_SIZE = 4096
+
+# What write_metadata_to_wav does when new metadata does not fit in place:
+# rewrite the whole file, or neutralize the old chunks and append after the data
+FALLBACK_REWRITE = 'rewrite'
+FALLBACK_APPEND = 'append'
+
+# Block size used when streaming kept chunks (e.g. audio data) between files
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Chunk layouts are compiled once and shared by all writers
+CHUNK_SERIALIZER = ChunkSerializer()
+
+# Per-thread block buffer for the read/write copy fallback, reused across files
+_copy_buffers = threading.local()
+
+
+class WriteResult(NamedTuple):
+    """Outcome of one file of a write_many batch"""
+    wav_filepath: str
+    ok: bool
+    error: Optional[Exception]
+    seconds: float
+
+
 class BWFMetadataWriter:
     """Write comprehensive BWF metadata to WAVE files"""
     
-    def __init__(self, wav_filepath: str, metadata_dict: Dict[str, Any]):
+    def __init__(self, wav_filepath: str, metadata_dict: Dict[str, Any], source_filepath: Optional[str] = None,
+                 reserve_size: int = DEFAULT_RESERVE_SIZE, fallback: str = FALLBACK_REWRITE,
+                 context: Optional[BatchContext] = None):
         """
         Initialize BWF Metadata Writer
         
         Args:
             wav_filepath: Path to WAV file to write metadata to
             metadata_dict: Dictionary containing metadata fields
+            source_filepath: Optional source WAV. When given, wav_filepath is created
+                from it in a single pass (copy and embed) instead of rewriting in place
+            reserve_size: Bytes of JUNK padding laid out after the metadata chunks
+                whenever the file is (re)written, so later edits fit in place
+            fallback: FALLBACK_REWRITE or FALLBACK_APPEND, used by in-place updates
+                when the new metadata outgrows the existing reserve
+            context: Batch values (timestamp, derived strings) shared with other
+                files; by default each write gets its own
         """
+        if fallback not in (FALLBACK_REWRITE, FALLBACK_APPEND):
+            raise ValueError(f"Unknown fallback '{fallback}'")
+        
         self.wav_filepath = wav_filepath
         self.metadata_dict = metadata_dict
+        self.source_filepath = source_filepath
+        self.reserve_size = reserve_size
+        self.fallback = fallback
+        self.context = context
         
         # Auto-write metadata on construction
         self.write_metadata()
     
+    @classmethod
+    def write_many(cls, jobs: Iterable[Sequence], reserve_size: int = DEFAULT_RESERVE_SIZE,
+                   fallback: str = FALLBACK_REWRITE, context: Optional[BatchContext] = None) -> List[WriteResult]:
+        """
+        Write metadata to a batch of files
+        
+        Every file shares one BatchContext, so all of them carry the same
+        timestamp and the strings derived from it are built once per batch.
+        
+        Args:
+            jobs: (wav_filepath, metadata_dict) or (wav_filepath, metadata_dict,
+                source_filepath) tuples; see __init__
+            reserve_size: See __init__
+            fallback: See __init__
+            context: Shared batch values (default: a new context stamped now)
+            
+        Returns:
+            One WriteResult per job, in order. A file that fails to write does
+            not stop the batch.
+        """
+        if context is None:
+            context = BatchContext(datetime.now())
+        
+        results = []
+        for job in jobs:
+            wav_filepath, metadata_dict = job[0], job[1]
+            source_filepath = job[2] if len(job) > 2 else None
+            start = time.perf_counter()
+            try:
+                cls(wav_filepath, metadata_dict, source_filepath=source_filepath,
+                    reserve_size=reserve_size, fallback=fallback, context=context)
+            except Exception as e:  # One bad file must not stop the batch
+                results.append(WriteResult(wav_filepath, False, e, time.perf_counter() - start))
+                continue
+            results.append(WriteResult(wav_filepath, True, None, time.perf_counter() - start))
+        return results
+    
     def write_metadata(self):
         """Write metadata to the WAV file using provided dictionary"""
         # Convert dictionary format to internal format
         metadata = self._convert_dict_to_metadata(self.metadata_dict)
         
         # Write to WAV file
-        self.write_metadata_to_wav(self.wav_filepath, metadata)
+        if self.source_filepath is not None:
+            self.export_metadata_to_wav(self.source_filepath, self.wav_filepath, metadata)
+        else:
+            self.write_metadata_to_wav(self.wav_filepath, metadata)
     
     def _convert_dict_to_metadata(self, metadata_dict: Dict[str, Any]) -> Dict[str, Any]:
         """Convert flat input dictionary to internal metadata format"""
@@ -67,349 +163,42 @@ class BWFMetadataWriter:
         
         return metadata
     
-    def create_bext_chunk(self, metadata: Dict[str, Any]) -> bytes:
+    def _batch_context(self) -> BatchContext:
+        """The shared batch context, or a fresh one stamped now"""
+        return self.context or BatchContext(datetime.now())
+    
+    def create_bext_chunk(self, metadata: Dict[str, Any], context: Optional[BatchContext] = None) -> bytes:
         """Create BEXT chunk from metadata"""
-        meta = metadata['metadata']
-        
-        # BEXT structure (BWF version 0)
-        bext_data = bytearray(602)  # Fixed size for version 0
-        
-        # Originator (32 bytes) - use Designer
-        originator = meta.get('Designer', '')[:31].encode('ascii', errors='replace')
-        bext_data[0:len(originator)] = originator
-        
-        # OriginatorReference (32 bytes) - use CatID + Source ID
-        ref = f"{meta.get('CatID', '')}_{meta.get('Source ID', '')}"[:31]
-        ref_bytes = ref.encode('ascii', errors='replace')
-        bext_data[32:32+len(ref_bytes)] = ref_bytes
-        
-        # Description (256 bytes)
-        desc = meta.get('Description', '')[:255].encode('ascii', errors='replace')
-        bext_data[64:64+len(desc)] = desc
-        
-        # OriginationDate (10 bytes) - current date YYYY-MM-DD
-        date_str = datetime.now().strftime('%Y-%m-%d').encode('ascii')
-        bext_data[320:320+len(date_str)] = date_str
-        
-        # OriginationTime (8 bytes) - current time HH:MM:SS
-        time_str = datetime.now().strftime('%H:%M:%S').encode('ascii')
-        bext_data[330:330+len(time_str)] = time_str
-        
-        # TimeReference (8 bytes) - set to 0
-        struct.pack_into('<Q', bext_data, 338, 0)
-        
-        # Version (2 bytes) - BWF version 0
-        struct.pack_into('<H', bext_data, 346, 0x0000)
-        
-        # UMID (64 bytes) - leave empty
-        # Reserved (190 bytes) - leave empty
-        # CodingHistory - leave empty for version 0
-        
-        return bytes(bext_data)
+        return CHUNK_SERIALIZER.bext(metadata['metadata'], context or self._batch_context())
     
-    def create_id3_chunk(self, metadata: Dict[str, Any]) -> bytes:
+    def create_id3_chunk(self, metadata: Dict[str, Any], context: Optional[BatchContext] = None) -> bytes:
         """Create ID3v2.3 chunk from metadata"""
-        meta = metadata['metadata']
-        
-        frames = []
-        
-        # Helper function to create text frame
-        def create_text_frame(frame_id: str, text: str) -> bytes:
-            if not text:
-                return b''
-            text_data = text.encode('utf-8', errors='replace')
-            frame_data = b'\x03' + text_data  # UTF-8 encoding
-            frame_size = len(frame_data)
-            frame_flags = b'\x00\x00'
-            return frame_id.encode('ascii') + struct.pack('>I', frame_size) + frame_flags + frame_data
-        
-        # Create frames
-        frames.append(create_text_frame('TIT2', meta.get('Title', '')))  # Title
-        frames.append(create_text_frame('TCON', meta.get('Category', '')))  # Genre/Category
-        frames.append(create_text_frame('TPE1', meta.get('Designer', '')))  # Artist
-        frames.append(create_text_frame('TPE2', meta.get('Library', '')))  # Album Artist
-        frames.append(create_text_frame('TOAL', meta.get('Library', '')))  # Original Album
-        frames.append(create_text_frame('TPUB', meta.get('URL', '')))  # Publisher
-        frames.append(create_text_frame('TIT1', meta.get('URL', '')))  # Content Group
-        frames.append(create_text_frame('TYER', str(datetime.now().year)))  # Year
-        frames.append(create_text_frame('TORY', str(datetime.now().year)))  # Original Year
-        frames.append(create_text_frame('TCOP', f"{datetime.now().year} {meta.get('Manufacturer', '')}"))  # Copyright
-        frames.append(create_text_frame('TIT3', meta.get('Notes', '')))  # Subtitle
-        frames.append(create_text_frame('TOWN', meta.get('Library', '')))  # Owner
-        frames.append(create_text_frame('TRCK', meta.get('Source ID', '0')))  # Track
-        
-        # Comment frame (COMM)
-        description = meta.get('Description', '')
-        if description:
-            comm_data = b'\x03eng\x00' + description.encode('utf-8', errors='replace')
-            comm_frame = b'COMM' + struct.pack('>I', len(comm_data)) + b'\x00\x00' + comm_data
-            frames.append(comm_frame)
-        
-        # Combine all frames
-        frames_data = b''.join(frames)
-        
-        # ID3v2 header
-        id3_size = len(frames_data)
-        # Convert to syncsafe integer
-        syncsafe_size = ((id3_size & 0x0FE00000) << 3) | ((id3_size & 0x001FC000) << 2) | ((id3_size & 0x00003F80) << 1) | (id3_size & 0x0000007F)
-        
-        header = b'ID3\x03\x00\x00' + struct.pack('>I', syncsafe_size)
-        
-        return header + frames_data
+        return CHUNK_SERIALIZER.id3(metadata['metadata'], context or self._batch_context())
     
-    def create_list_info_chunk(self, metadata: Dict[str, Any]) -> bytes:
+    def create_list_info_chunk(self, metadata: Dict[str, Any], context: Optional[BatchContext] = None) -> bytes:
         """Create LIST INFO chunk from metadata"""
-        meta = metadata['metadata']
-        
-        def create_info_subchunk(chunk_id: str, text: str) -> bytes:
-            if not text:
-                return b''
-            text_data = text.encode('utf-8', errors='replace') + b'\x00'
-            # Pad to even length
-            if len(text_data) % 2:
-                text_data += b'\x00'
-            return chunk_id.encode('ascii') + struct.pack('<I', len(text_data)) + text_data
-        
-        subchunks = []
-        subchunks.append(create_info_subchunk('ISFT', 'BWF Metadata Writer'))  # Software
-        subchunks.append(create_info_subchunk('INAM', metadata['filename']))  # Name
-        subchunks.append(create_info_subchunk('ICRD', datetime.now().strftime('%Y-%m-%d')))  # Creation date
-        subchunks.append(create_info_subchunk('IPRD', meta.get('Library', '')))  # Product
-        subchunks.append(create_info_subchunk('IGNR', meta.get('Category', '')))  # Genre
-        subchunks.append(create_info_subchunk('ICOP', f"{datetime.now().year} {meta.get('Manufacturer', '')}"))  # Copyright
-        subchunks.append(create_info_subchunk('ICMT', meta.get('Description', '')))  # Comment
-        subchunks.append(create_info_subchunk('IARL', f"© {datetime.now().year} {meta.get('Manufacturer', '')} All Rights Reserved"))  # Archival location
-        subchunks.append(create_info_subchunk('IART', meta.get('Designer', '')))  # Artist
-        
-        info_data = b'INFO' + b''.join(subchunks)
-        list_size = len(info_data)
-        
-        return b'LIST' + struct.pack('<I', list_size) + info_data
+        return CHUNK_SERIALIZER.list_info(metadata['metadata'], metadata['filename'], context or self._batch_context())
     
-    def create_ixml_chunk(self, metadata: Dict[str, Any]) -> bytes:
+    def create_ixml_chunk(self, metadata: Dict[str, Any], context: Optional[BatchContext] = None) -> bytes:
         """Create iXML chunk with both Steinberg and USER sections"""
-        meta = metadata['metadata']
-        current_year = str(datetime.now().year)
-        current_date = datetime.now().strftime('%Y-%m-%d')
-        current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Build Steinberg ATTR_LIST
-        steinberg_attrs = [
-            ('MediaLibrary', 'string', meta.get('Library', '')),
-            ('MediaCategoryPost', 'string', meta.get('Category', '')),
-            ('MediaRecordingMethod', 'string', meta.get('Microphone', '')),
-            ('MediaComment', 'string', meta.get('Description', '')),
-            ('MusicalCategory', 'string', meta.get('SubCategory', '')),
-            ('MediaCompany', 'string', meta.get('URL', '')),
-            ('MediaLibraryManufacturerName', 'string', meta.get('Manufacturer', '')),
-            ('MediaArtist', 'string', meta.get('Designer', '')),
-            ('MediaTrackNumber', 'string', meta.get('Source ID', '0')),
-            ('SmfSongName', 'string', metadata['filename']),
-            ('MusicalInstrument', 'string', metadata['filename']),
-        ]
-        
-        # Build USER section fields
-        subcategory = meta.get('SubCategory', '') or meta.get('Subcategory', '')
-        category = meta.get('Category', '')
-        category_full = f"{category}-{subcategory}" if category and subcategory else category or subcategory
-        
-        # Handle field name variations
-        rec_medium = meta.get('Recording Medium', '') or meta.get('RecMedium', '')
-        mic_perspective = meta.get('Microphone Perspective', '') or meta.get('MicPerspective', '')
-        
-        user_fields = [
-            ('MICROPHONE', meta.get('Microphone', '')),
-            ('LIBRARY', meta.get('Library', '')),
-            ('CATEGORYFULL', category_full),
-            ('DESCRIPTION', meta.get('Description', '')),
-            ('TRACKTITLE', meta.get('TrackTitle', '') or metadata['filename']),
-            ('NOTES', meta.get('Notes', '')),
-            ('ARTIST', meta.get('Designer', '')),
-            ('TRACKYEAR', current_year),
-            ('CATEGORY', category),
-            ('SOURCE', meta.get('URL', '')),
-            ('EMBEDDER', 'BWF Metadata Writer'),
-            ('TRACK', meta.get('Source ID', '0')),
-            ('KEYWORDS', meta.get('Keywords', '') or metadata['filename']),
-            ('URL', meta.get('URL', '')),
-            ('VOLUME', meta.get('URL', '')),
-            ('SHOOTDATE', current_datetime),
-            ('SUBCATEGORY', subcategory),
-            ('MANUFACTURER', meta.get('Manufacturer', '')),
-            ('RATING', '0'),
-            ('FXNAME', meta.get('FX Name', '')),
-            ('CATID', meta.get('CatID', '') or meta.get('CatId', '')),
-            ('RELEASEDATE', current_date),
-            ('MICPERSPECTIVE', mic_perspective),
-            ('RECORDINGMEDIUM', rec_medium),
-            ('MICCONFIG', meta.get('Microphone Configuration', '')),
-            ('INOUTSIDE', meta.get('Inside or Outside', '')),
-            ('LOCATION', meta.get('Location', '')),
-            ('USERCATEGORY', meta.get('User Category', '')),
-            ('VENDORCATEGORY', meta.get('Vendor Category', '')),
-        ]
-        
-        # Build XML structure
-        root = ET.Element('BWFXML')
-        
-        # IXML_VERSION
-        version_elem = ET.SubElement(root, 'IXML_VERSION')
-        version_elem.text = '1.61'
-        
-        # STEINBERG section
-        steinberg_elem = ET.SubElement(root, 'STEINBERG')
-        attr_list_elem = ET.SubElement(steinberg_elem, 'ATTR_LIST')
-        
-        for name, attr_type, value in steinberg_attrs:
-            if value:  # Only add non-empty values
-                attr_elem = ET.SubElement(attr_list_elem, 'ATTR')
-                name_elem = ET.SubElement(attr_elem, 'NAME')
-                name_elem.text = name
-                type_elem = ET.SubElement(attr_elem, 'TYPE')
-                type_elem.text = attr_type
-                value_elem = ET.SubElement(attr_elem, 'VALUE')
-                value_elem.text = str(value)
-        
-        # USER section
-        user_elem = ET.SubElement(root, 'USER')
-        for field_name, field_value in user_fields:
-            if field_value:  # Only add non-empty values
-                field_elem = ET.SubElement(user_elem, field_name)
-                field_elem.text = str(field_value)
-        
-        # Convert to string with proper formatting
-        xml_str = ET.tostring(root, encoding='unicode')
-        # Add proper indentation
-        xml_formatted = self._format_xml(xml_str)
-        
-        xml_data = xml_formatted.encode('utf-8')
-        return xml_data
+        return CHUNK_SERIALIZER.ixml(metadata['metadata'], metadata['filename'], context or self._batch_context())
     
-    def _format_xml(self, xml_str: str) -> str:
-        """Format XML with proper indentation"""
-        # Simple formatting - add newlines and indentation
-        formatted = xml_str.replace('><', '>\n<')
-        lines = formatted.split('\n')
-        indented_lines = []
-        indent_level = 0
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('</'):
-                indent_level -= 1
-            
-            indented_lines.append('  ' * indent_level + line)
-            
-            if line.startswith('<') and not line.startswith('</') and not line.endswith('/>') and not '>' in line[1:]:
-                indent_level += 1
-            elif line.startswith('<') and not line.startswith('</') and not line.endswith('/>'):
-                # Opening tag with content
-                pass
-        
-        return '\n'.join(indented_lines)
-    
-    def create_xmp_chunk(self, metadata: Dict[str, Any]) -> bytes:
+    def create_xmp_chunk(self, metadata: Dict[str, Any], context: Optional[BatchContext] = None) -> bytes:
         """Create XMP (_PMX) chunk from metadata"""
-        meta = metadata['metadata']
-        current_datetime = datetime.now().isoformat()
-        
-        # Escape XML special characters
-        def escape_xml(text):
-            if not text:
-                return ''
-            return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&apos;')
-        
-        category = meta.get('Category', '')
-        subcategory = meta.get('SubCategory', '')
-        genre = f"{category}-{subcategory}" if category and subcategory else category or subcategory
-        
-        xmp_template = f'''<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>
-<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="XMP Core 5.5.0">
-   <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
-      <rdf:Description rdf:about=""
-            xmlns:xmp="http://ns.adobe.com/xap/1.0/"
-            xmlns:dc="http://purl.org/dc/elements/1.1/"
-            xmlns:xmpDM="http://ns.adobe.com/xmp/1.0/DynamicMedia/">
-         <xmp:CreatorTool>BWF Metadata Writer</xmp:CreatorTool>
-         <xmp:MetadataDate>{current_datetime}</xmp:MetadataDate>
-         <xmp:ModifyDate>{current_datetime}</xmp:ModifyDate>
-         <xmp:rating>0.000000</xmp:rating>
-         <dc:description>
-            <rdf:Alt>
-               <rdf:li xml:lang="x-default">{escape_xml(meta.get('Description', ''))}</rdf:li>
-               <rdf:li xml:lang="en-US">{escape_xml(meta.get('Description', ''))}</rdf:li>
-            </rdf:Alt>
-         </dc:description>
-         <dc:publisher>
-            <rdf:Bag>
-               <rdf:li>{escape_xml(meta.get('URL', ''))}</rdf:li>
-            </rdf:Bag>
-         </dc:publisher>
-         <dc:title>
-            <rdf:Alt>
-               <rdf:li xml:lang="x-default">{escape_xml(meta.get('FX Name', ''))}</rdf:li>
-               <rdf:li xml:lang="en-US">{escape_xml(meta.get('FX Name', ''))}</rdf:li>
-            </rdf:Alt>
-         </dc:title>
-         <xmpDM:comment>{escape_xml(meta.get('Notes', ''))}</xmpDM:comment>
-         <xmpDM:logComment>{escape_xml(meta.get('Notes', ''))}</xmpDM:logComment>
-         <xmpDM:album>{escape_xml(meta.get('Library', ''))}</xmpDM:album>
-         <xmpDM:artist>{escape_xml(meta.get('Designer', ''))}</xmpDM:artist>
-         <xmpDM:genre>{escape_xml(genre)}</xmpDM:genre>
-      </rdf:Description>
-   </rdf:RDF>
-</x:xmpmeta>
-<?xpacket end="w"?>'''
-        
-        return xmp_template.encode('utf-8')
+        return CHUNK_SERIALIZER.xmp(metadata['metadata'], context or self._batch_context())
     
-    def write_metadata_to_wav(self, wav_file: str, metadata: Dict[str, Any]):
-        """Write all metadata chunks to existing WAV file"""
-        # Create all chunks
-        bext_chunk = self.create_bext_chunk(metadata)
-        id3_chunk = self.create_id3_chunk(metadata)
-        list_chunk = self.create_list_info_chunk(metadata)
-        ixml_chunk = self.create_ixml_chunk(metadata)
-        xmp_chunk = self.create_xmp_chunk(metadata)
-        
-        # Read existing WAV file
-        with open(wav_file, 'rb') as f:
-            original_data = f.read()
-        
-        # Parse existing RIFF structure
-        if original_data[:4] != b'RIFF' or original_data[8:12] != b'WAVE':
-            raise ValueError("Not a valid WAV file")
-        
-        # Find existing chunks and remove metadata chunks if they exist
-        chunks_to_keep = []
-        pos = 12  # Skip RIFF header
-        original_size = struct.unpack('<I', original_data[4:8])[0]
-        
-        while pos < len(original_data) and pos < original_size + 8:
-            if pos + 8 > len(original_data):
-                break
-                
-            chunk_id = original_data[pos:pos+4]
-            chunk_size = struct.unpack('<I', original_data[pos+4:pos+8])[0]
-            
-            # Skip metadata chunks we're replacing
-            if chunk_id not in [b'bext', b'ID3 ', b'LIST', b'iXML', b'_PMX']:
-                chunk_data = original_data[pos:pos+8+chunk_size]
-                # Add padding if needed
-                if chunk_size % 2:
-                    if pos + 8 + chunk_size < len(original_data):
-                        chunk_data += original_data[pos+8+chunk_size:pos+8+chunk_size+1]
-                chunks_to_keep.append(chunk_data)
-            
-            # Move to next chunk
-            pos += 8 + chunk_size
-            if chunk_size % 2:  # Skip padding
-                pos += 1
+    def build_metadata_chunks(self, metadata: Dict[str, Any]) -> bytes:
+        """Build the bext, ID3, LIST, iXML and _PMX chunks (with headers and padding)"""
+        # One context for all chunks so their dates agree
+        context = self._batch_context()
+        bext_chunk = self.create_bext_chunk(metadata, context)
+        id3_chunk = self.create_id3_chunk(metadata, context)
+        list_chunk = self.create_list_info_chunk(metadata, context)
+        ixml_chunk = self.create_ixml_chunk(metadata, context)
+        xmp_chunk = self.create_xmp_chunk(metadata, context)
         
-        # Build new file
         new_chunks = []
         
-        # Add our metadata chunks first
         new_chunks.append(b'bext' + struct.pack('<I', len(bext_chunk)) + bext_chunk)
         if len(bext_chunk) % 2:
             new_chunks[-1] += b'\x00'
@@ -430,23 +219,307 @@ class BWFMetadataWriter:
         if len(xmp_chunk) % 2:
             new_chunks[-1] += b'\x00'
         
-        # Add existing chunks
-        new_chunks.extend(chunks_to_keep)
+        return b''.join(new_chunks)
+    
+    def build_padding_chunk(self, reserve_size: int) -> bytes:
+        """Build a zero-filled JUNK chunk with (at least) reserve_size bytes of payload"""
+        if reserve_size <= 0:
+            return b''
+        reserve_size += reserve_size % 2
+        return PADDING_CHUNK_ID + struct.pack('<I', reserve_size) + bytes(reserve_size)
+    
+    def _build_ds64_chunk(self, riff_size: int, data_size: int, sample_count: int,
+                          table: List[Tuple[bytes, int]]) -> bytes:
+        """Build an RF64 ds64 chunk (riff/data sizes, sample count and size table)"""
+        payload = struct.pack('<QQQI', riff_size, data_size, sample_count, len(table))
+        for chunk_id, chunk_size in table:
+            payload += chunk_id + struct.pack('<Q', chunk_size)
+        return DS64_CHUNK_ID + struct.pack('<I', len(payload)) + payload
+    
+    def _copy_range(self, src, dst, offset: int, length: int):
+        """
+        Copy length bytes starting at offset from src to the current position of dst
+        
+        Both files must be unbuffered (opened with buffering=0) so the OS file
+        positions are authoritative. Uses kernel-side copy where available and
+        falls back to COPY_BLOCK_SIZE reads/writes.
+        """
+        copied = _kernel_copy(src.fileno(), dst.fileno(), offset, length)
+        
+        src.seek(offset + copied)
+        remaining = length - copied
+        if remaining <= 0:
+            return
+        
+        buffer = getattr(_copy_buffers, 'buffer', None)
+        if buffer is None:
+            buffer = _copy_buffers.buffer = memoryview(bytearray(COPY_BLOCK_SIZE))
+        while remaining > 0:
+            count = src.readinto(buffer[:min(COPY_BLOCK_SIZE, remaining)])
+            if not count:
+                break
+            _write_all(dst, buffer[:count])
+            remaining -= count
+    
+    def _stream_wav(self, source_file: str, destination_file: str, metadata_chunks: bytes):
+        """
+        Write destination_file as metadata_chunks followed by the non-metadata
+        chunks of source_file, in a single streaming pass
+        
+        Output goes to a temporary file next to the destination which then replaces
+        it, so source and destination may be the same file. Existing padding chunks
+        are dropped; metadata_chunks is expected to carry the new reserve. RF64/BW64
+        sources keep their form, and plain RIFF is promoted to RF64 when the output
+        would not fit in 32-bit sizes.
+        """
+        with open(source_file, 'rb', buffering=0) as src:
+            index = RiffIndex(src)
+            # Drop the metadata chunks we're replacing (and any old padding/ds64)
+            chunks_to_keep = [chunk for chunk in index
+                              if chunk.id not in METADATA_CHUNK_IDS and chunk.id not in (PADDING_CHUNK_ID, DS64_CHUNK_ID)]
+            
+            new_file_size = 4 + len(metadata_chunks) + sum(index.length(chunk) for chunk in chunks_to_keep)  # +4 for 'WAVE'
+            large_chunks = [(chunk.id, chunk.size) for chunk in chunks_to_keep
+                            if chunk.size > MAX_RIFF_SIZE and chunk.id != b'data']
+            is_rf64 = (index.is_rf64 or new_file_size > MAX_RIFF_SIZE
+                       or any(chunk.size > MAX_RIFF_SIZE for chunk in chunks_to_keep))
+            
+            if is_rf64:
+                data_chunk = index.find(b'data')
+                ds64_length = 8 + 28 + 12 * len(large_chunks)
+                ds64_chunk = self._build_ds64_chunk(new_file_size + ds64_length, data_chunk.size if data_chunk else 0,
+                                                    index.frame_count(src), large_chunks)
+                header = (index.form if index.is_rf64 else b'RF64') + struct.pack('<I', MAX_RIFF_SIZE) + b'WAVE' + ds64_chunk
+            else:
+                header = b'RIFF' + struct.pack('<I', new_file_size) + b'WAVE'
+            
+            fd, temp_path = tempfile.mkstemp(prefix='.bwf_', suffix='.tmp', dir=os.path.dirname(os.path.abspath(destination_file)))
+            try:
+                with os.fdopen(fd, 'wb', buffering=0) as dst:
+                    # Header and our metadata chunks first, then the existing chunks
+                    _write_all(dst, header + metadata_chunks)
+                    for chunk in chunks_to_keep:
+                        # Headers are rewritten so sizes match the output form
+                        if is_rf64 and (chunk.id == b'data' or chunk.size > MAX_RIFF_SIZE):
+                            header_size = MAX_RIFF_SIZE
+                        else:
+                            header_size = chunk.size
+                        _write_all(dst, chunk.id + struct.pack('<I', header_size))
+                        self._copy_range(src, dst, chunk.offset + 8, index.length(chunk) - 8)
+                shutil.copymode(source_file, temp_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        
+        os.replace(temp_path, destination_file)
+    
+    def _find_metadata_region(self, index: RiffIndex) -> Optional[Tuple[int, int]]:
+        """
+        Find the contiguous run of metadata and padding chunks that holds every
+        metadata chunk in the file
+        
+        Returns:
+            (offset, length) of the run, or None if the metadata chunks are missing
+            or spread over several runs
+        """
+        region = None
+        run_start = run_end = None
+        run_has_metadata = False
+        
+        for chunk in index.chunks + [None]:
+            if chunk is not None and (chunk.id in METADATA_CHUNK_IDS or chunk.id == PADDING_CHUNK_ID):
+                if run_start is None:
+                    run_start = chunk.offset
+                    run_has_metadata = False
+                run_end = chunk.offset + index.length(chunk)
+                run_has_metadata = run_has_metadata or chunk.id in METADATA_CHUNK_IDS
+                continue
+            
+            # Run ended
+            if run_start is not None and run_has_metadata:
+                if region is not None:
+                    return None
+                region = (run_start, run_end - run_start)
+            run_start = None
+        
+        return region
+    
+    def _update_in_place(self, wav_file: str, metadata_chunks: bytes) -> bool:
+        """
+        Overwrite the existing metadata region of wav_file with metadata_chunks
+        
+        Only the header region is written; the RIFF size and the audio data are
+        untouched. Any space left over is re-marked as a JUNK chunk.
+        
+        Returns:
+            True if the update was written, False if it does not fit
+        """
+        with open(wav_file, 'r+b', buffering=0) as f:
+            region = self._find_metadata_region(RiffIndex(f))
+            if region is None:
+                return False
+            
+            region_offset, region_length = region
+            spare = region_length - len(metadata_chunks)
+            # Leftover space needs at least a JUNK header to stay a valid chunk
+            if spare != 0 and spare < 8:
+                return False
+            
+            data = metadata_chunks
+            if spare:
+                data += PADDING_CHUNK_ID + struct.pack('<I', spare - 8) + bytes(spare - 8)
+            _pwrite(f, data, region_offset)
+        
+        return True
+    
+    def _append_metadata(self, wav_file: str, metadata_chunks: bytes) -> bool:
+        """
+        Place metadata_chunks at the end of the RIFF instead of in front of the data
+        
+        Existing metadata chunks are neutralized by renaming their IDs to JUNK
+        (a trailing run of metadata/JUNK chunks is reclaimed instead), the new
+        chunks plus reserve are written after the last chunk and only the RIFF
+        size field is patched. Cost is proportional to the metadata, not the audio.
+        
+        Returns:
+            True if the metadata was appended, False if the file layout does not
+            allow it (e.g. a truncated last chunk)
+        """
+        with open(wav_file, 'r+b', buffering=0) as f:
+            index = RiffIndex(f)
+            if not index.chunks:
+                return False
+            
+            # The last chunk must be complete; only a missing pad byte can be repaired
+            last = index.chunks[-1]
+            if not index.is_complete(last):
+                return False
+            end = last.offset + 8 + last.size + last.padding
+            
+            # Reclaim a trailing run of metadata/padding chunks (e.g. a previous append)
+            tail_start = end
+            for chunk in reversed(index.chunks):
+                if chunk.id not in METADATA_CHUNK_IDS and chunk.id != PADDING_CHUNK_ID:
+                    break
+                tail_start = chunk.offset
+            
+            data = metadata_chunks + self.build_padding_chunk(self.reserve_size)
+            if tail_start == end and last.padding:
+                data = b'\x00' + data
+                tail_start = last.offset + 8 + last.size
+            
+            new_end = tail_start + len(data)
+            # Growing a plain RIFF past 4 GiB needs a ds64 chunk; leave that to a rewrite
+            if not index.is_rf64 and new_end - 8 > MAX_RIFF_SIZE:
+                return False
+            
+            _pwrite(f, data, tail_start)
+            f.truncate(new_end)
+            if index.is_rf64:
+                # RIFF size lives in the ds64 chunk (first chunk, right after the header)
+                _pwrite(f, struct.pack('<Q', new_end - 8), 12 + 8)
+            else:
+                _pwrite(f, struct.pack('<I', new_end - 8), 4)
+            
+            # Neutralize the old metadata chunks in front of the new ones
+            for chunk in index:
+                if chunk.offset < tail_start and chunk.id in METADATA_CHUNK_IDS:
+                    _pwrite(f, PADDING_CHUNK_ID, chunk.offset)
+        
+        return True
+    
+    def write_metadata_to_wav(self, wav_file: str, metadata: Dict[str, Any]):
+        """
+        Write all metadata chunks to existing WAV file
+        
+        If the file already has a metadata region (our chunks plus JUNK reserve)
+        large enough for the new chunks, it is overwritten in place. Otherwise,
+        depending on self.fallback, the new chunks are appended after the data
+        (FALLBACK_APPEND) or the file is rewritten through a temporary file next to
+        it (FALLBACK_REWRITE), both with a fresh reserve of self.reserve_size bytes.
+        Only chunk headers are read while scanning; kept chunks (including data)
+        are streamed across so memory use does not grow with file size.
+        """
+        metadata_chunks = self.build_metadata_chunks(metadata)
+        
+        if self._update_in_place(wav_file, metadata_chunks):
+            print(f"Successfully updated metadata in place in {wav_file}")
+            return
         
-        # Calculate new file size
-        new_data = b''.join(new_chunks)
-        new_file_size = len(new_data) + 4  # +4 for 'WAVE'
+        if self.fallback == FALLBACK_APPEND and self._append_metadata(wav_file, metadata_chunks):
+            print(f"Successfully appended metadata to {wav_file}")
+            return
         
-        # Write new file
-        with open(wav_file, 'wb') as f:
-            f.write(b'RIFF')
-            f.write(struct.pack('<I', new_file_size))
-            f.write(b'WAVE')
-            f.write(new_data)
+        self._stream_wav(wav_file, wav_file, metadata_chunks + self.build_padding_chunk(self.reserve_size))
         
         print(f"Successfully wrote metadata to {wav_file}")
+    
+    def export_metadata_to_wav(self, source_file: str, destination_file: str, metadata: Dict[str, Any]):
+        """
+        Copy source_file to destination_file with all metadata chunks embedded
+        
+        Replaces a copy followed by write_metadata_to_wav: the source is read once
+        and the destination written once.
+        """
+        metadata_chunks = self.build_metadata_chunks(metadata) + self.build_padding_chunk(self.reserve_size)
+        self._stream_wav(source_file, destination_file, metadata_chunks)
+        
+        print(f"Successfully exported {source_file} with metadata to {destination_file}")
+
+
+def _write_all(f, data: bytes):
+    """Write all of data to an unbuffered file (raw writes may be partial)"""
+    view = memoryview(data)
+    while view:
+        written = f.write(view)
+        view = view[written:]
 
 
+def _pwrite(f, data: bytes, offset: int):
+    """Write all of data at offset of an unbuffered file"""
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(f.fileno(), view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        f.seek(offset)
+        _write_all(f, data)
+
+
+# Errors meaning "kernel copy not supported here", not a real I/O failure
+_KERNEL_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSOCK, errno.EBADF, errno.EPERM}
+
+def _kernel_copy(src_fd: int, dst_fd: int, offset: int, length: int) -> int:
+    """
+    Copy up to length bytes from src_fd at offset to the current position of dst_fd
+    using os.copy_file_range or os.sendfile
+    
+    Returns:
+        Number of bytes copied (0 if neither call is available on this platform)
+    """
+    for method in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, method):
+            continue
+        copied = 0
+        try:
+            while copied < length:
+                count = min(length - copied, 0x40000000)
+                if method == 'copy_file_range':
+                    n = os.copy_file_range(src_fd, dst_fd, count, offset + copied)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, offset + copied, count)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in _KERNEL_COPY_UNSUPPORTED:
+                raise
+        if copied:
+            return copied
+    return 0
+
 def main():
     parser = argparse.ArgumentParser(description='BWF Metadata Writer - Write metadata to WAV files')
     parser.add_argument('wav_file', help='Path to WAV file to write metadata to')
@@ -1,8 +1,78 @@
-import CTK
-import Claude_DragAndDrop as DragDropApp
+import builtins
+import multiprocessing
+import sys
+import time
 
+# import Claude_DragAndDrop as DragDropApp
 # app = DragDropApp.DragDropApp()
 # app.run()
 
-app = CTK.App()
-app.mainloop()
\ No newline at end of file
+# Cold start budget in seconds (imports + config + main window), checked by --profile-startup
+STARTUP_BUDGET = 1.0
+
+def profileStartup():
+    """
+    Start the app the usual way, but report how long each module took to import
+    and each initialisation step took, then exit instead of entering the main loop.
+    """
+    imports = []  # (depth, module, inclusive seconds, self seconds)
+    stack = []
+    originalImport = builtins.__import__
+
+    def timedImport(name, globals=None, *args, **kwargs):
+        if name in sys.modules:
+            return originalImport(name, globals, *args, **kwargs)
+        # "from . import x" has no name; show the package it's relative to
+        label = name or (globals or {}).get('__package__') or '.'
+        entry = [len(stack), label, 0.0, 0.0]
+        imports.append(entry)
+        stack.append(0.0)  # Time spent in nested imports
+        start = time.perf_counter()
+        try:
+            return originalImport(name, globals, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            entry[2], entry[3] = elapsed, elapsed - nested
+            if stack:
+                stack[-1] += elapsed
+
+    steps = []
+
+    def step(label, function):
+        start = time.perf_counter()
+        result = function()
+        steps.append((label, time.perf_counter() - start))
+        return result
+
+    builtins.__import__ = timedImport
+    try:
+        CTK = step('import CTK', lambda: __import__('CTK'))
+    finally:
+        builtins.__import__ = originalImport
+    step('load config', CTK.Metadata.getConfig)
+    app = step('create main window', CTK.App)
+    step('first draw', app.update)
+    app.destroy()
+
+    print("\nImports (inclusive / self, ms):")
+    for depth, name, inclusive, own in imports:
+        if inclusive >= 0.001:
+            print(f"  {inclusive * 1000:8.1f} {own * 1000:8.1f}  {'  ' * depth}{name}")
+    print("\nStartup steps (ms):")
+    for label, seconds in steps:
+        print(f"  {seconds * 1000:8.1f}  {label}")
+    total = sum(seconds for _, seconds in steps)
+    verdict = "within" if total <= STARTUP_BUDGET else "OVER"
+    print(f"  {total * 1000:8.1f}  total ({verdict} the {STARTUP_BUDGET * 1000:.0f} ms budget)")
+
+if __name__ == '__main__':
+    # Needed for the process pool export option in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    if '--profile-startup' in sys.argv:
+        profileStartup()
+        sys.exit()
+    # Imported here so process pool workers don't load the GUI
+    import CTK
+    app = CTK.App()
+    app.mainloop()
@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+
+import configparser
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from configManager import ConfigManager, BATCH_DEFAULTS, BATCH_KEY, DEFAULT_FLUSH_DELAY
+
+"""
+Metadata Store - SQLite backend for ConfigManager
+Keeps every file's settings as one row of an indexed files table instead of
+two config.ini sections, so loading is instant and lookups such as "files
+missing a CatID" are index queries. The get_value/set_value/add_section API
+is unchanged.
+"""
+
+# Templates whose sections are stored in the files table, and the section kind they map to
+FILE_KINDS = {'Basic File': 'basic', 'Advanced File': 'adv'}
+ADV_SUFFIX = '_adv'
+
+# File settings with an index for lookups
+INDEXED_KEYS = ('CatID', 'Category', 'Creator ID')
+
+
+def column_name(key: str) -> str:
+    """Column of the files table that stores a setting (keys are case-insensitive)"""
+    return key.lower().replace(' ', '_')
+
+
+class SQLiteConfigManager(ConfigManager):
+    """
+    ConfigManager backed by a SQLite database
+
+    Sections created from the 'Basic File' template (<file>) and the
+    'Advanced File' template (<file>_adv) share one row of the files table,
+    keyed by the file's full path: a section is the row of the path its
+    basename resolves to (see path_resolver), so files with the same name in
+    different folders have separate rows. A name that isn't listed resolves
+    to the latest row stored under it. Every template key is a column (NULL
+    meaning "inherited", see ConfigManager.resolved), and any other keys go
+    to a JSON column (the file's batch included). All other sections (USER,
+    batch defaults, custom sections) are stored in the settings table.
+
+    Changes are written to the database as they are made. Committing is
+    write-behind, just like config.ini saves.
+    """
+
+    def __init__(self, config_file="config.db", flush_delay=DEFAULT_FLUSH_DELAY, import_from=None,
+                 path_resolver: Optional[Callable[[str], str]] = None):
+        """
+        Args:
+            config_file: Path of the database
+            flush_delay: Seconds changes are held before they are committed
+            import_from: config.ini to import when the database is created
+            path_resolver: Maps a file's section name (its basename) to its full
+                path, or returns the name itself if the file isn't listed;
+                defaults to the name itself. Call paths_changed() when its
+                answers change
+        """
+        self.import_from = import_from
+        self.path_resolver = path_resolver or (lambda name: name)
+        self.db = None
+        self._columns: Dict[str, Dict[str, str]] = {}
+        self._locations: Dict[str, Tuple[str, str]] = {}
+        self._all_located = False  # True once _locations holds every section
+        self._paths_generation = 0  # Bumped by paths_changed()
+        super().__init__(config_file, flush_delay)
+
+    def load_config(self):
+        """Open the database, creating (and importing config.ini into) it if it doesn't exist"""
+        if self.db is not None:
+            return
+
+        created = not os.path.exists(self.config_file)
+        self.db = sqlite3.connect(self.config_file, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.config = None  # Sections live in the database, not in a ConfigParser
+
+        with self._lock:
+            self._create_schema()
+            if created and self.import_from and os.path.exists(self.import_from):
+                self.import_ini(self.import_from)
+            self.db.commit()
+
+        if created:
+            print(f"Created metadata store {self.config_file}")
+        else:
+            print(f"Loaded metadata store from {self.config_file}")
+
+    def _create_schema(self):
+        """Create the tables on first use and learn which keys have their own column"""
+        columns = [column_name(key) for template in FILE_KINDS for key in self.section_templates[template]]
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, '
+            'name TEXT NOT NULL, '
+            'has_basic INTEGER NOT NULL DEFAULT 0, '
+            'has_adv INTEGER NOT NULL DEFAULT 0, '
+            'basic_extra TEXT, '
+            'adv_extra TEXT, '
+            + ', '.join(f'"{column}" TEXT' for column in columns) + ')')
+        self.db.execute('CREATE INDEX IF NOT EXISTS files_name ON files (name)')
+        for key in INDEXED_KEYS:
+            column = column_name(key)
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS "files_{column}" ON files ("{column}")')
+        self.db.execute('CREATE TABLE IF NOT EXISTS sections (name TEXT PRIMARY KEY)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS settings ('
+                        'section TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (section, key))')
+
+        # Map keys to the columns that actually exist (a database created with
+        # an older template keeps newer keys in the JSON column)
+        existing = {row[1] for row in self.db.execute('PRAGMA table_info(files)')}
+        for template, kind in FILE_KINDS.items():
+            self._columns[kind] = {key.lower(): column_name(key) for key in self.section_templates[template]
+                                   if column_name(key) in existing}
+
+    def _locate(self, section) -> Optional[Tuple[str, str]]:
+        """
+        Where a section is stored
+
+        Returns:
+            ('settings', section), ('basic', path) or ('adv', path), or None if
+            the section doesn't exist
+        """
+        location = self._locations.get(section)
+        if location is not None or self._all_located:
+            return location
+
+        if self.db.execute('SELECT 1 FROM sections WHERE name = ?', (section,)).fetchone():
+            location = ('settings', section)
+        else:
+            kind, name = ('adv', section[:-len(ADV_SUFFIX)]) if section.endswith(ADV_SUFFIX) else ('basic', section)
+            path = self._row_path(name,
+                                  lambda path: self.db.execute('SELECT 1 FROM files WHERE path = ?', (path,)).fetchone() is not None,
+                                  lambda: (self.db.execute('SELECT path FROM files WHERE name = ? ORDER BY rowid DESC LIMIT 1',
+                                                           (name,)).fetchone() or (None,))[0])
+            if path is None or not self.db.execute(f'SELECT has_{kind} FROM files WHERE path = ?', (path,)).fetchone()[0]:
+                return None
+            location = (kind, path)
+        self._locations[section] = location
+        return location
+
+    def _row_path(self, name, exists: Callable[[str], bool], latest: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        Path of the files row that holds a file's sections, or None
+
+        A listed file's row is the one of its full path; a row created before
+        the file was listed (stored under its name) is moved to that path. A
+        file that isn't listed gets the latest row stored under its name.
+        """
+        path = self.path_resolver(name)
+        if exists(path):
+            return path
+        if path == name:
+            return latest()
+        if exists(name):
+            self.db.execute('UPDATE files SET path = ? WHERE path = ?', (path, name))
+            self._mark_dirty()
+            return path
+        return None
+
+    def _locate_all(self):
+        """Fill the location cache for every section with one query per table"""
+        if self._all_located:
+            return
+        generation = self._paths_generation
+        locations = {name: ('settings', name) for (name,) in self.db.execute('SELECT name FROM sections')}
+        rows = {}    # path -> (has_basic, has_adv)
+        latest = {}  # name -> path of its latest row
+        for path, name, has_basic, has_adv in self.db.execute('SELECT path, name, has_basic, has_adv FROM files ORDER BY rowid'):
+            rows[path] = (has_basic, has_adv)
+            latest[name] = path
+        for name in latest:
+            path = self._row_path(name, rows.__contains__, lambda: latest[name])
+            if path is None:
+                continue
+            has_basic, has_adv = rows.get(path) or rows[name]
+            if has_basic:
+                locations.setdefault(name, ('basic', path))
+            if has_adv:
+                locations.setdefault(name + ADV_SUFFIX, ('adv', path))
+        if generation != self._paths_generation:
+            return self._locate_all()  # The file list changed while resolving
+        self._locations.update(locations)
+        self._all_located = True
+
+    def paths_changed(self):
+        """Forget where file sections are stored, after the files their names resolve to changed"""
+        with self._lock:
+            self._paths_generation += 1
+            self._locations.clear()
+            self._all_located = False
+            self._invalidate()
+
+    def _extra(self, kind, path) -> Dict[str, str]:
+        row = self.db.execute(f'SELECT {kind}_extra FROM files WHERE path = ?', (path,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def _store(self, location, key, value):
+        """Write one setting (key already lower-cased) to an existing section"""
+        kind, target = location
+        if kind == 'settings':
+            self.db.execute('INSERT OR REPLACE INTO settings (section, key, value) VALUES (?, ?, ?)', (target, key, value))
+            return
+        column = self._columns[kind].get(key)
+        if column is not None:
+            self.db.execute(f'UPDATE files SET "{column}" = ? WHERE path = ?', (value, target))
+        else:
+            extra = self._extra(kind, target)
+            extra[key] = value
+            self.db.execute(f'UPDATE files SET {kind}_extra = ? WHERE path = ?', (json.dumps(extra), target))
+
+    def _add_file_section(self, kind, name, values: Dict[str, str]):
+        """Flag a file's basic/advanced section as present and fill in its values"""
+        columns = self._columns[kind]
+        assigned = {}
+        extra = {}
+        for key, value in values.items():
+            key = key.lower()
+            if key in columns:
+                assigned[columns[key]] = value
+            else:
+                extra[key] = value
+
+        # Share the row of the file's other section if it has one
+        sibling = self._locate(name if kind == 'adv' else name + ADV_SUFFIX)
+        path = sibling[1] if sibling is not None else self.path_resolver(name)
+        self.db.execute('INSERT OR IGNORE INTO files (path, name) VALUES (?, ?)', (path, name))
+        self.db.execute(f'UPDATE files SET has_{kind} = 1, {kind}_extra = ?'
+                        + ''.join(f', "{column}" = ?' for column in assigned) + ' WHERE path = ?',
+                        (json.dumps(extra) if extra else None, *assigned.values(), path))
+        self._locations[name + ADV_SUFFIX if kind == 'adv' else name] = (kind, path)
+
+    def _add_settings_section(self, section, values: Dict[str, str]):
+        self.db.execute('INSERT OR IGNORE INTO sections (name) VALUES (?)', (section,))
+        self._locations[section] = ('settings', section)
+        for key, value in values.items():
+            self._store(('settings', section), key.lower(), value)
+
+    def add_section(self, section_name, template_type=None):
+        """
+        Add a new section with default template values
+
+        Args:
+            section_name: Name of the section to add
+            template_type: Type of template to use (defaults to section_name)
+        """
+        if template_type is None:
+            template_type = section_name
+
+        with self._lock:
+            if self._locate(section_name) is not None:
+                return True
+
+            if template_type not in self.section_templates:
+                print(f"Template '{template_type}' not found. Available templates: {list(self.section_templates.keys())}")
+                return False
+
+            self._create_section(section_name, template_type)
+            self._mark_dirty()
+
+        print(f"Added section '{section_name}' with template '{template_type}'")
+        return True
+
+    def _create_section(self, section_name, template_type):
+        """Add a section from a template (caller holds the lock and checks it's new)"""
+        self._invalidate(section_name)
+        kind = FILE_KINDS.get(template_type)
+        if kind == 'adv' and section_name.endswith(ADV_SUFFIX):
+            self._add_file_section(kind, section_name[:-len(ADV_SUFFIX)], {})
+        elif kind == 'basic' and not section_name.endswith(ADV_SUFFIX):
+            self._add_file_section(kind, section_name, {})
+        else:
+            self._add_settings_section(section_name, self.section_templates[template_type])
+
+    def section_exists(self, section_name) -> bool:
+        with self._lock:
+            return self._locate(section_name) is not None
+
+    def add_custom_section(self, section_name, custom_defaults=None):
+        """
+        Add a section with custom default values
+
+        Args:
+            section_name: Name of the section
+            custom_defaults: Dictionary of key-value pairs for the section
+        """
+        with self._lock:
+            if self._locate(section_name) is not None:
+                print(f"Section '{section_name}' already exists!")
+                return False
+            self._add_settings_section(section_name, {key: str(value) for key, value in (custom_defaults or {}).items()})
+            self._invalidate(section_name)
+            self._mark_dirty()
+
+        print(f"Added custom section '{section_name}'")
+        return True
+
+    def _own_items(self, section):
+        """Values stored in the section itself (keys lower case), or None if it doesn't exist"""
+        with self._lock:
+            location = self._locate(section)
+            if location is None:
+                return None
+            kind, target = location
+            if kind == 'settings':
+                return dict(self.db.execute('SELECT key, value FROM settings WHERE section = ? ORDER BY rowid', (target,)))
+            columns = self._columns[kind]
+            row = self.db.execute('SELECT ' + ', '.join(f'"{column}"' for column in columns.values()) +
+                                  ' FROM files WHERE path = ?', (target,)).fetchone()
+            items = {key: value for key, value in zip(columns, row) if value is not None}
+            items.update(self._extra(kind, target))
+            return items
+
+    def _file_template(self, section):
+        """Template a file section inherits from, or None for settings sections"""
+        location = self._locate(section)
+        if location is None or location[0] == 'settings':
+            return None
+        return 'Advanced File' if location[0] == 'adv' else 'Basic File'
+
+    def set_value(self, section: str, key, value):
+        """Set a value in config"""
+        with self._lock:
+            location = self._locate(section)
+            if location is None:
+                print(f"Section '{section}' doesn't exist. Creating it first.")
+                raise configparser.NoSectionError(section)
+            self._store(location, key.lower(), str(value))
+            self._invalidate(section)
+            self._mark_dirty()
+
+    def set_many(self, sections, values, template_type=None):
+        """
+        Set the same keys in many sections in one transaction
+
+        See ConfigManager.set_many. Column keys of file sections are written
+        with one executemany per key.
+        """
+        sections = list(sections)
+        updates = self._prepare_many(sections, values, template_type)
+
+        with self.transaction():
+            self._locate_all()
+            locations = []
+            created = 0
+            for section in sections:
+                location = self._locate(section)
+                if location is None:
+                    if template_type is None:
+                        raise configparser.NoSectionError(section)
+                    self._create_section(section, template_type)
+                    location = self._locate(section)
+                    created += 1
+                locations.append(location)
+
+            for key, column in updates:
+                key = key.lower()
+                batches: Dict[str, list] = {}
+                for location, value in zip(locations, column):
+                    kind, target = location
+                    file_column = self._columns[kind].get(key) if kind != 'settings' else None
+                    if file_column is None:
+                        self._store(location, key, value)
+                    else:
+                        batches.setdefault(file_column, []).append((value, target))
+                for file_column, rows in batches.items():
+                    self.db.executemany(f'UPDATE files SET "{file_column}" = ? WHERE path = ?', rows)
+
+            self._invalidate()
+
+        self._report_many(sections, updates, created)
+
+    def set_defaults(self, sections, values, template_type, batch):
+        """
+        Store values once as the batch's defaults and clear the batch's overrides
+
+        See ConfigManager.set_defaults. Members are tagged with one
+        executemany, and overrides cleared with one executemany per key.
+        """
+        sections = list(sections)
+        if any(isinstance(value, (list, tuple)) for value in values.values()):
+            raise ValueError("Batch defaults take a single value per key")
+        updates = self._prepare_many(sections, values, template_type)
+        defaults = self._defaults_section(batch, template_type)
+        kind = FILE_KINDS[template_type]
+
+        with self.transaction():
+            self._locate_all()
+            if self._locate(defaults) is None:
+                self._add_settings_section(defaults, {})
+            created = 0
+            members = {}  # path -> section
+            for section in sections:
+                if self._locate(section) is None:
+                    self._create_section(section, template_type)
+                    created += 1
+                members[self._locate(section)[1]] = section
+
+            # Tag the members that aren't in the batch yet; one that moves from
+            # another batch keeps that batch's values as its own
+            tagged = []
+            for path, extra in self.db.execute(f'SELECT path, {kind}_extra FROM files WHERE has_{kind} = 1').fetchall():
+                if path not in members:
+                    continue
+                extra = json.loads(extra) if extra else {}
+                if extra.get(BATCH_KEY) == batch:
+                    continue
+                if extra.get(BATCH_KEY):
+                    own = self._own_items(members[path])
+                    for key, value in self._batch_items(members[path], own).items():
+                        if key not in own:
+                            self._store((kind, path), key, value)
+                    extra = self._extra(kind, path)
+                extra[BATCH_KEY] = batch
+                tagged.append((json.dumps(extra), path))
+            self.db.executemany(f'UPDATE files SET {kind}_extra = ? WHERE path = ?', tagged)
+
+            for key, column in updates:
+                key = key.lower()
+                self._store(('settings', defaults), key, column[0])
+                file_column = self._columns[kind].get(key)
+                if file_column is not None:
+                    self.db.executemany(f'UPDATE files SET "{file_column}" = NULL WHERE path = ? AND "{file_column}" IS NOT NULL',
+                                        [(path,) for path in members])
+                else:
+                    for path in members:
+                        extra = self._extra(kind, path)
+                        if extra.pop(key, None) is not None:
+                            self.db.execute(f'UPDATE files SET {kind}_extra = ? WHERE path = ?', (json.dumps(extra), path))
+
+            self._invalidate()
+
+        self._report_many(sections, updates, created)
+
+    def commit(self):
+        """Commit pending changes to the database now (no-op if nothing changed)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty or self.db is None:
+                return
+            try:
+                self.db.commit()
+                self._dirty = False
+                print(f"Configuration saved to {self.config_file}")
+            except sqlite3.Error as e:
+                print(f"Error saving config: {e}")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group a bulk update into one database transaction
+
+        Committed when the block ends. If the block raises, its changes are
+        rolled back (the in-memory metadata mirror is not).
+        """
+        with self._lock:
+            self.commit()  # Settle earlier changes so a rollback only undoes this block
+            try:
+                yield self
+            except BaseException:
+                self.db.rollback()
+                self._locations.clear()
+                self._all_located = False
+                self._invalidate()
+                self._dirty = False
+                raise
+            self._dirty = True
+            self.commit()
+
+    def list_sections(self):
+        """List all sections in config"""
+        with self._lock:
+            self._locate_all()
+            sections = [row[0] for row in self.db.execute('SELECT name FROM sections ORDER BY rowid')]
+            for path, name in self.db.execute('SELECT path, name FROM files ORDER BY rowid'):
+                for section, kind in ((name, 'basic'), (name + ADV_SUFFIX, 'adv')):
+                    if self._locations.get(section) == (kind, path):
+                        sections.append(section)
+            return sections
+
+    def remove_section(self, section_name):
+        """Remove a section from config"""
+        with self._lock:
+            location = self._locate(section_name)
+            if location is not None:
+                kind, target = location
+                if kind == 'settings':
+                    self.db.execute('DELETE FROM settings WHERE section = ?', (target,))
+                    self.db.execute('DELETE FROM sections WHERE name = ?', (target,))
+                else:
+                    cleared = ', '.join(f'"{column}" = NULL' for column in self._columns[kind].values())
+                    self.db.execute(f'UPDATE files SET has_{kind} = 0, {kind}_extra = NULL, {cleared} WHERE path = ?', (target,))
+                    self.db.execute('DELETE FROM files WHERE path = ? AND has_basic = 0 AND has_adv = 0', (target,))
+                del self._locations[section_name]
+                self._invalidate(section_name)
+                self._mark_dirty()
+        if location is not None:
+            print(f"Removed section '{section_name}'")
+            return True
+        else:
+            print(f"Section '{section_name}' not found")
+            return False
+
+    def files_missing(self, key) -> List[str]:
+        """Files (section names) whose resolved setting for an indexed or template key is empty"""
+        return self.files_with(key, '')
+
+    def files_with(self, key, value) -> List[str]:
+        """Files (section names) whose resolved setting for a template key equals value"""
+        kind, column = self._file_column(key)
+        value = str(value)
+        with self._lock:
+            # A NULL column inherits from the file's batch defaults, or else from the template
+            batches = self._batch_values(kind, key)
+            batch = f"json_extract({kind}_extra, '$.{BATCH_KEY}')"
+            if self._template_value(kind, key) == value:
+                others = [b for b, v in batches.items() if v != value]
+                inherited = f'{batch} IS NULL OR {batch} NOT IN ({", ".join("?" * len(others))})'
+            else:
+                others = [b for b, v in batches.items() if v == value]
+                inherited = f'{batch} IN ({", ".join("?" * len(others))})'
+            condition = f'"{column}" = ? OR ("{column}" IS NULL AND ({inherited}))'
+            self._locate_all()
+            suffix = ADV_SUFFIX if kind == 'adv' else ''
+            # Rows of other files with the same name (e.g. from an earlier batch) are not sections
+            return [name for path, name in self.db.execute(
+                f'SELECT path, name FROM files WHERE has_{kind} = 1 AND ({condition}) ORDER BY rowid', (value, *others))
+                    if self._locations.get(name + suffix) == (kind, path)]
+
+    def _template_value(self, kind, key) -> str:
+        """Value a file section of the given kind gets for key from its template"""
+        template = 'Advanced File' if kind == 'adv' else 'Basic File'
+        return {k.lower(): v for k, v in self.section_templates[template].items()}.get(key.lower(), '')
+
+    def _batch_values(self, kind, key) -> Dict[str, str]:
+        """{batch id: value} of the batches whose defaults set key for sections of the given kind"""
+        values = {}
+        for section, value in self.db.execute('SELECT section, value FROM settings WHERE key = ? AND section LIKE ?',
+                                              (key.lower(), BATCH_DEFAULTS + '%')):
+            batch = section[len(BATCH_DEFAULTS):]
+            if batch.endswith(ADV_SUFFIX) == (kind == 'adv'):
+                values[batch[:-len(ADV_SUFFIX)] if kind == 'adv' else batch] = value
+        return values
+
+    def _file_column(self, key) -> Tuple[str, str]:
+        for kind, columns in self._columns.items():
+            if key.lower() in columns:
+                return kind, columns[key.lower()]
+        raise ValueError(f"'{key}' is not a file template key")
+
+    def import_ini(self, ini_file):
+        """
+        Copy every section of a config.ini into the database
+
+        <file>_adv sections and sections holding Basic File keys become file
+        rows; USER, batch defaults and everything else are stored as settings
+        sections.
+        """
+        parser = configparser.ConfigParser()
+        parser.read(ini_file)
+        basic_keys = set(self._columns['basic'])
+        with self._lock:
+            for section in parser.sections():
+                values = dict(parser.items(section))
+                if self._locate(section) is not None:
+                    continue
+                if section in self.settings_sections or section.startswith(BATCH_DEFAULTS):
+                    self._add_settings_section(section, values)
+                elif section.endswith(ADV_SUFFIX):
+                    self._add_file_section('adv', section[:-len(ADV_SUFFIX)], values)
+                elif basic_keys & set(values):
+                    self._add_file_section('basic', section, values)
+                else:
+                    self._add_settings_section(section, values)
+        print(f"Imported {len(parser.sections())} sections from {ini_file}")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Union
+
+"""
+RIFF Index - Header-only chunk table for WAVE (RIFF/RF64/BW64) files
+Walks chunk headers by seeking, never reading payloads, so indexing a large
+batch costs a few small reads per file regardless of audio size
+"""
+
+# RIFF variants whose 64-bit sizes are stored in a ds64 chunk (EBU Tech 3306 / ITU-R BS.2088)
+RF64_FORMS = (b'RF64', b'BW64')
+DS64_CHUNK_ID = b'ds64'
+
+# Largest size a 32-bit RIFF size field can hold; also the "see ds64" marker in RF64
+MAX_RIFF_SIZE = 0xFFFFFFFF
+
+
+class RiffChunk(NamedTuple):
+    """One entry of the chunk table"""
+    id: bytes       # Four character chunk ID, e.g. b'data'
+    offset: int     # File offset of the chunk header
+    size: int       # Payload size (64-bit size from ds64 where applicable)
+    padding: int    # Pad byte after an odd sized payload (0 or 1)
+
+
+class RiffIndex:
+    """Chunk table of a WAVE file, built from chunk headers only"""
+
+    def __init__(self, source: Union[str, os.PathLike, BinaryIO]):
+        """
+        Index a WAVE file
+
+        Args:
+            source: Path to the file, or a binary file object open for reading
+                (its position is moved, the file is not closed)
+        """
+        self.path = None
+        self.form = b''
+        self.file_size = 0
+        self.riff_size = 0
+        self.sample_count = None  # From ds64 (RF64/BW64 only)
+        self.chunks: List[RiffChunk] = []
+
+        if isinstance(source, (str, os.PathLike)):
+            self.path = os.fspath(source)
+            with open(source, 'rb') as f:
+                self._index(f)
+        else:
+            self.path = getattr(source, 'name', None)
+            self._index(source)
+
+    def _index(self, f: BinaryIO):
+        """Walk the chunk headers of an open file"""
+        f.seek(0, os.SEEK_END)
+        self.file_size = f.tell()
+        f.seek(0)
+        header = f.read(12)
+        if len(header) < 12 or header[:4] not in (b'RIFF',) + RF64_FORMS or header[8:12] != b'WAVE':
+            raise ValueError("Not a valid WAV file")
+
+        self.form = header[:4]
+        self.riff_size = struct.unpack('<I', header[4:8])[0]
+        data_size = None
+        size_table = {}
+
+        if self.is_rf64:
+            # ds64 must be the first chunk and holds the 64-bit sizes
+            ds64_header = f.read(8)
+            if len(ds64_header) < 8 or ds64_header[:4] != DS64_CHUNK_ID:
+                raise ValueError(f"{self.form.decode('ascii')} file without ds64 chunk")
+            ds64_size = struct.unpack('<I', ds64_header[4:8])[0]
+            ds64 = f.read(ds64_size)
+            if len(ds64) < 28:
+                raise ValueError("Invalid ds64 chunk")
+            self.riff_size, data_size, self.sample_count = struct.unpack('<QQQ', ds64[:24])
+            table_length = struct.unpack('<I', ds64[24:28])[0]
+            for i in range(table_length):
+                entry = ds64[28 + 12 * i:40 + 12 * i]
+                if len(entry) < 12:
+                    break
+                size_table[entry[:4]] = struct.unpack('<Q', entry[4:12])[0]
+
+        pos = 12  # Skip RIFF header
+        while pos < self.file_size and pos < self.riff_size + 8:
+            f.seek(pos)
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+
+            chunk_id = chunk_header[:4]
+            chunk_size = struct.unpack('<I', chunk_header[4:8])[0]
+            if chunk_size == MAX_RIFF_SIZE and self.is_rf64:
+                chunk_size = data_size if chunk_id == b'data' else size_table.get(chunk_id, chunk_size)
+
+            self.chunks.append(RiffChunk(chunk_id, pos, chunk_size, chunk_size % 2))
+            pos += 8 + chunk_size + (chunk_size % 2)
+
+    @property
+    def is_rf64(self) -> bool:
+        return self.form in RF64_FORMS
+
+    def __iter__(self) -> Iterator[RiffChunk]:
+        return iter(self.chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def find(self, chunk_id: bytes) -> Optional[RiffChunk]:
+        """First chunk with the given ID, or None"""
+        for chunk in self.chunks:
+            if chunk.id == chunk_id:
+                return chunk
+        return None
+
+    def length(self, chunk: RiffChunk) -> int:
+        """Bytes the chunk occupies (header, payload, pad byte), clipped to the end of the file"""
+        return min(8 + chunk.size + chunk.padding, self.file_size - chunk.offset)
+
+    def is_complete(self, chunk: RiffChunk) -> bool:
+        """True if the whole payload of the chunk is present in the file"""
+        return self.length(chunk) >= 8 + chunk.size
+
+    def read_payload(self, f: BinaryIO, chunk: RiffChunk, limit: Optional[int] = None) -> bytes:
+        """Read (up to limit bytes of) a chunk payload from an open file"""
+        f.seek(chunk.offset + 8)
+        return f.read(chunk.size if limit is None else min(chunk.size, limit))
+
+    def read_format(self, f: Optional[BinaryIO] = None) -> Optional[dict]:
+        """
+        Parse the fmt chunk
+
+        Returns:
+            Dictionary with format_tag, channels, sample_rate, byte_rate,
+            block_align and bits_per_sample, or None if there is no fmt chunk
+
+        Raises:
+            ValueError: The fmt chunk is cut off by the end of the file
+        """
+        chunk = self.find(b'fmt ')
+        if chunk is None or chunk.size < 16:
+            return None
+        if f is None:
+            with open(self.path, 'rb') as fh:
+                payload = self.read_payload(fh, chunk, 16)
+        else:
+            payload = self.read_payload(f, chunk, 16)
+        if len(payload) < 16:
+            raise ValueError("Truncated fmt chunk")
+        format_tag, channels, sample_rate, byte_rate, block_align, bits = struct.unpack('<HHIIHH', payload)
+        return {
+            'format_tag': format_tag,
+            'channels': channels,
+            'sample_rate': sample_rate,
+            'byte_rate': byte_rate,
+            'block_align': block_align,
+            'bits_per_sample': bits,
+        }
+
+    def frame_count(self, f: Optional[BinaryIO] = None) -> int:
+        """Number of sample frames in the data chunk (0 if unknown)"""
+        data = self.find(b'data')
+        fmt = self.read_format(f)
+        if data is None or fmt is None or not fmt['block_align']:
+            return 0
+        return data.size // fmt['block_align']
+
+    def duration(self, f: Optional[BinaryIO] = None) -> Optional[float]:
+        """Duration of the audio in seconds, or None if it can't be determined"""
+        data = self.find(b'data')
+        fmt = self.read_format(f)
+        if data is None or fmt is None or not fmt['block_align'] or not fmt['sample_rate']:
+            return None
+        return (data.size // fmt['block_align']) / fmt['sample_rate']
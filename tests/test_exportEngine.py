@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from exportEngine import BatchExporter, ExportJob, ExportManifest, export_file
+from test_ixml import wav_bytes
+
+
+def run(exporter, timeout=10.0):
+    """Start exporter and collect its events until 'finished' (fails on timeout)"""
+    exporter.start()
+    events = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events.extend(exporter.poll())
+        if events and events[-1][0] == 'finished':
+            return events
+        time.sleep(0.01)
+    raise AssertionError("BatchExporter never posted 'finished'")
+
+
+class BatchExporterFinishedTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.jobs = [ExportJob(os.path.join(self.tempdir.name, f'missing{i}.wav'),
+                               os.path.join(self.tempdir.name, f'out{i}.wav'), {}) for i in range(5)]
+
+    def test_submit_failure_fails_remaining_jobs(self):
+        with mock.patch.object(ThreadPoolExecutor, 'submit', side_effect=RuntimeError('pool broken')):
+            events = run(BatchExporter(self.jobs, max_workers=2))
+
+        summary = events[-1][1]
+        self.assertEqual(summary.total, 5)
+        self.assertEqual(len(summary.failed), 5)
+        self.assertEqual(summary.cancelled, 0)
+        self.assertEqual(len([event for event in events if event[0] == 'result']), 5)
+
+    def test_manifest_errors_still_finish(self):
+        manifest = ExportManifest(os.path.join(self.tempdir.name, 'manifest.json'))
+        with mock.patch.object(manifest, 'get', side_effect=TypeError('bad entry')), \
+                mock.patch.object(manifest, 'save', side_effect=TypeError('not serializable')):
+            events = run(BatchExporter(self.jobs, max_workers=2, manifest=manifest))
+
+        summary = events[-1][1]
+        self.assertEqual(len(summary.failed), 5)
+
+
+class IncrementalExportTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.source = os.path.join(self.tempdir.name, 'source.wav')
+        with open(self.source, 'wb') as f:
+            f.write(wav_bytes(48000))
+        self.destination = os.path.join(self.tempdir.name, 'destination.wav')
+
+    def export(self, metadata, previous=None):
+        return export_file(ExportJob(self.source, self.destination, metadata), previous=previous, incremental=True)
+
+    def test_metadata_only_change_updates_destination_in_place(self):
+        first = self.export({'Description': 'Door slam'})
+        size = os.path.getsize(self.destination)
+
+        with mock.patch('ixml.BWFMetadataWriter._stream_wav') as stream:
+            second = self.export({'Description': 'Heavy door slam'}, first.entry)
+        stream.assert_not_called()  # The audio wasn't copied again
+
+        self.assertTrue(second.ok and second.updated and not second.skipped)
+        self.assertEqual(os.path.getsize(self.destination), size)
+        with open(self.destination, 'rb') as f:
+            self.assertIn(b'Heavy door slam', f.read())
+        self.assertTrue(self.export({'Description': 'Heavy door slam'}, second.entry).skipped)
+
+
+if __name__ == '__main__':
+    unittest.main()
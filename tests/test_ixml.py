@@ -0,0 +1,61 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from ixml import BWFMetadataWriter
+
+
+def wav_bytes(frames=100):
+    """16-bit mono PCM WAV of silence"""
+    fmt = struct.pack('<HHIIHH', 1, 1, 48000, 96000, 2, 16)
+    data = b'\x00\x00' * frames
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(data)) + data
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+def truncated_fmt_bytes():
+    """RF64 file whose fmt chunk is cut off after 6 of its 16 bytes"""
+    fmt = b'fmt ' + struct.pack('<I', 16) + b'\x01\x00\x01\x00\x80\xbb'
+    ds64_length = 8 + 28
+    ds64 = b'ds64' + struct.pack('<I', 28) + struct.pack('<QQQI', 4 + ds64_length + len(fmt), 0, 0, 0)
+    return b'RF64' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' + ds64 + fmt
+
+
+class WriteManyTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def make(self, name, content):
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_truncated_fmt_fails_only_that_file(self):
+        sources = [self.make('first.wav', wav_bytes()),
+                   self.make('truncated.wav', truncated_fmt_bytes()),
+                   self.make('last.wav', wav_bytes())]
+        metadata = {'CatID': 'DOORWood', 'TrackTitle': 'Door'}
+        jobs = [(source + '.out', metadata, source) for source in sources]
+
+        results = BWFMetadataWriter.write_many(jobs)
+
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertIsInstance(results[1].error, ValueError)
+
+    def test_unexpected_error_fails_only_that_file(self):
+        sources = [self.make(name, wav_bytes()) for name in ('first.wav', 'bad.wav', 'last.wav')]
+        metadata = {'CatID': 'DOORWood'}
+        jobs = [(source + '.out', metadata, source) for source in sources]
+        jobs[1] = (jobs[1][0], {'Description': 5}, jobs[1][2])  # Not a string: TypeError
+
+        results = BWFMetadataWriter.write_many(jobs)
+
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertIsInstance(results[1].error, TypeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from ucsData import REVIEW_CONFIDENCE, Classification, preselected
+
+
+class PreselectedTest(unittest.TestCase):
+    def results(self, confidence):
+        return [Classification(0, 'DOORWood', 10.0, confidence)]
+
+    def test_untagged_confident_file_is_preselected(self):
+        results = {'door_slam.wav': self.results(0.9)}
+        self.assertEqual(preselected(results, {'door_slam.wav': ''}), {'door_slam.wav'})
+
+    def test_file_with_catid_is_not_preselected(self):
+        results = {'door_slam.wav': self.results(0.9)}
+        current = {'door_slam.wav': 'DOORMetl'}
+        self.assertEqual(preselected(results, current), set())
+
+    def test_low_confidence_guess_is_not_preselected(self):
+        results = {'door_slam.wav': self.results(REVIEW_CONFIDENCE / 2)}
+        self.assertEqual(preselected(results, {}), set())
+
+    def test_file_without_suggestions_is_ignored(self):
+        self.assertEqual(preselected({'noise.wav': []}, {}), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,146 @@
 import customtkinter as ctk
-import pandas as pd
 import os
 import sys
 from tkinter import ttk
 from CTkMessagebox import CTkMessagebox
+import ucsData
+
+# How often the popup checks for a finished background search (ms)
+SEARCH_POLL_MS = 15
+
+# Treeview row height (px) and rows kept attached above/below the visible ones
+ROW_HEIGHT = 25
+OVERSCAN_ROWS = 10
+
+# Results columns: (width, minwidth, stretch)
+COLUMN_LAYOUT = {
+    'CatID': (80, 50, False),
+    'Category': (100, 70, False),
+    'SubCategory': (120, 80, False),
+    'Explanations': (250, 100, True),
+    'Synonyms': (250, 100, True),
+}
+
+class VirtualTreeview:
+    """
+    Shows a long list of rows in a ttk.Treeview with only the rows in (and
+    just around) the viewport attached
+
+    The tree item for a row is created the first time the row scrolls into
+    view and is detached/reattached after that, so showing a new filter or
+    scrolling costs about a window's worth of Tk calls however many rows
+    match. The scrollbar and mouse wheel drive the window instead of the
+    tree's own scrolling.
+    """
+
+    def __init__(self, tree, scrollbar):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.rows = []          # All rows, as tuples of cell text
+        self.visible = []       # Indices of the rows that match the filter
+        self.offset = 0         # Position in visible of the top row in the viewport
+        self.items = {}         # Row index -> tree item ID
+        self.shown = []         # Attached item IDs, in display order
+        self.start = 0          # Position in visible of shown[0]
+
+        scrollbar.configure(command=self.yview)
+        tree.configure(yscrollcommand=lambda first, last: None)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(sequence, self.on_wheel)
+        for sequence in ("<Up>", "<Down>", "<Prior>", "<Next>"):
+            tree.bind(sequence, self.on_key)
+        tree.bind("<Configure>", lambda event: self.render())
+
+    def set_rows(self, rows):
+        """Replace the table (drops all items)"""
+        self.tree.delete(*self.tree.get_children())
+        self.rows = rows
+        self.items = {}
+        self.shown = []
+        self.show(range(len(rows)))
+
+    def show(self, visible):
+        """Show only the rows with these indices (ascending), scrolled to the top"""
+        self.visible = visible
+        self.offset = 0
+        self.render()
+
+    def page_size(self):
+        """Rows that fit in the viewport (below the heading)"""
+        return max(1, self.tree.winfo_height() // ROW_HEIGHT - 1)
+
+    def render(self):
+        """Attach the rows around the viewport and detach the rest of the previous window"""
+        page = self.page_size()
+        total = len(self.visible)
+        self.offset = max(0, min(self.offset, total - page))
+        self.start = max(0, self.offset - OVERSCAN_ROWS)
+        end = min(total, self.offset + page + OVERSCAN_ROWS)
+
+        window = [self._item(row) for row in self.visible[self.start:end]]
+        keep = set(window)
+        gone = [item for item in self.shown if item not in keep]
+        if gone:
+            self.tree.detach(*gone)
+        for position, item in enumerate(window):
+            self.tree.move(item, "", position)
+        self.shown = window
+
+        self.tree.yview_moveto(0)
+        if self.offset > self.start:
+            self.tree.yview_scroll(self.offset - self.start, "units")
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + page) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _item(self, row):
+        item = self.items.get(row)
+        if item is None:
+            item = self.tree.insert("", "end", values=self.rows[row])
+            self.items[row] = item
+        return item
+
+    def scroll_to(self, offset):
+        self.offset = offset
+        self.render()
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.visible)))
+        elif args[0] == "scroll":
+            step = self.page_size() if args[2] == "pages" else 1
+            self.scroll_to(self.offset + int(args[1]) * step)
+
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return "break"
+
+    def on_key(self, event):
+        """Move the focus one row/page, scrolling the window to keep it in view"""
+        if not self.visible:
+            return "break"
+        page = self.page_size()
+        focus = self.tree.focus()
+        position = self.start + self.shown.index(focus) if focus in self.shown else self.offset - 1
+        step = {"Up": -1, "Down": 1, "Prior": -page, "Next": page}[event.keysym]
+        position = max(0, min(len(self.visible) - 1, position + step))
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + page:
+            self.offset = position - page + 1
+        self.render()
+        item = self._item(self.visible[position])
+        self.tree.focus(item)
+        self.tree.selection_set(item)
+        return "break"
 
 class UCSPopup(ctk.CTkToplevel):
-    def __init__(self, master, excel_path, catID_textbox, cat_textbox, sub_textbox, ucsAll, on_close_callback=None):
+    def __init__(self, master, excel_path, catID_textbox, cat_textbox, sub_textbox, ucsAll, on_close_callback=None, cache_dir=None):
         super().__init__(master)
 
         print("UCSPopup: __init__ started")
@@ -19,20 +153,24 @@ class UCSPopup(ctk.CTkToplevel):
 
         self.master_app = master
         self.excel_path = excel_path
+        self.cache_dir = cache_dir
         self.catID_entry = catID_textbox
         self.cat_entry = cat_textbox
         self.sub_entry = sub_textbox
         self.ucsAll = ucsAll
 
-        self.df = None
-        self.filtered_df = None
+        self.rows = []
+        self.filtered_rows = []
+        self.search_index = None
+        self.searcher = None
+        self._search_poll = None
 
         style = ttk.Style(self)
         style.theme_use("clam")
         style.configure("Treeview",
                         background="#2b2b2b",
                         foreground="white",
-                        rowheight=25,
+                        rowheight=ROW_HEIGHT,
                         fieldbackground="#2b2b2b",
                         bordercolor="#3f3f3f",
                         lightcolor="#3f3f3f",
@@ -74,9 +212,11 @@ class UCSPopup(ctk.CTkToplevel):
         self.tree = ttk.Treeview(self.tree_container_frame, show="headings")
         self.tree.grid(row=0, column=0, sticky="nsew")
 
-        self.vsb = ctk.CTkScrollbar(self.tree_container_frame, command=self.tree.yview)
+        self.vsb = ctk.CTkScrollbar(self.tree_container_frame)
         self.vsb.grid(row=0, column=1, sticky="ns")
-        self.tree.configure(yscrollcommand=self.vsb.set)
+        # Only the rows around the viewport are in the tree; the view drives the scrollbar
+        self.view = VirtualTreeview(self.tree, self.vsb)
+        self.setup_columns()
 
         self.hsb = ctk.CTkScrollbar(self.tree_container_frame, orientation="horizontal", command=self.tree.xview)
         self.hsb.grid(row=1, column=0, sticky="ew")
@@ -102,20 +242,18 @@ class UCSPopup(ctk.CTkToplevel):
     def load_excel_file(self, path):
         print(f"load_excel_file: Attempting to load from {path}")
         try:
-            # === IMPORTANT: Use the ACTUAL column name from Excel for reading ===
-            actual_excel_columns = ['CatID', 'Category', 'SubCategory', 'Explanations', 'Synonyms - Comma Separated']
-            # Specify header=2 because your data starts on the 3rd row (index 2)
-            self.df = pd.read_excel(path, usecols=actual_excel_columns, header=2)
-
-            # === RENAME the column AFTER loading ===
-            if 'Synonyms - Comma Separated' in self.df.columns:
-                self.df.rename(columns={'Synonyms - Comma Separated': 'Synonyms'}, inplace=True)
-                print("load_excel_file: 'Synonyms - Comma Separated' column renamed to 'Synonyms'.")
-
-            self.filtered_df = self.df.copy()
-            print(f"load_excel_file: DataFrame loaded successfully. Shape: {self.df.shape}")
-            print(f"load_excel_file: DataFrame columns after rename: {self.df.columns.tolist()}")
-            self.populate_table()
+            actual_excel_columns = ucsData.EXCEL_COLUMNS
+            # Shared with the app (usually already built by its warm-up thread);
+            # 'Synonyms - Comma Separated' is already renamed to 'Synonyms'
+            catalog = ucsData.load_catalog(path, self.cache_dir)
+            self.rows = catalog.rows
+            self.search_index = catalog.search_index
+            self.searcher = ucsData.BackgroundSearch(self.search_index)
+
+            self.filtered_rows = list(range(len(self.rows)))
+            print(f"load_excel_file: Table loaded successfully. Rows: {len(self.rows)}")
+            self.view.set_rows(self.rows)
+            self.update_results_count()
         except FileNotFoundError:
             print(f"load_excel_file: FileNotFoundError: {path}")
             CTkMessagebox(title="Error", message=f"Excel file not found at: {path}", icon="cancel",
@@ -133,63 +271,49 @@ class UCSPopup(ctk.CTkToplevel):
                               option_1="OK", master=self)
             self.destroy()
 
-    def populate_table(self):
-        print("populate_table: called")
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        if self.filtered_df is not None and not self.filtered_df.empty:
-            print(f"populate_table: Filtered DataFrame is not empty. Rows: {len(self.filtered_df)}")
-            columns = self.filtered_df.columns.tolist()
-            self.tree["columns"] = columns
-            self.tree["show"] = "headings"
-
-            for col in columns:
-                self.tree.heading(col, text=col, anchor="w")
-                # Adjust widths for the new names if necessary
-                if col == 'CatID':
-                    self.tree.column(col, width=80, minwidth=50, stretch=False)
-                elif col == 'Category':
-                    self.tree.column(col, width=100, minwidth=70, stretch=False)
-                elif col == 'SubCategory':
-                    self.tree.column(col, width=120, minwidth=80, stretch=False)
-                elif col == 'Synonyms': # Use the new, renamed column name here for width adjustment
-                    self.tree.column(col, width=250, minwidth=100, stretch=True)
-                else: # For 'Explanations'
-                    self.tree.column(col, width=250, minwidth=100, stretch=True)
-
-
-            for index, row in self.filtered_df.iterrows():
-                self.tree.insert("", "end", values=list(row))
-            print("populate_table: Data inserted into Treeview.")
-        else:
-            print("populate_table: Filtered DataFrame is empty or None.")
-            self.tree["columns"] = ("No Data",)
-            self.tree.heading("No Data", text="No data to display or no results found.", anchor="center")
-            self.tree.column("No Data", width=980, stretch=True)
+    def setup_columns(self):
+        """Configure the results columns (once; filtering only changes which rows are attached)"""
+        self.tree["columns"] = ucsData.COLUMNS
+        self.tree["show"] = "headings"
+        for col in ucsData.COLUMNS:
+            width, minwidth, stretch = COLUMN_LAYOUT[col]
+            self.tree.heading(col, text=col, anchor="w")
+            self.tree.column(col, width=width, minwidth=minwidth, stretch=stretch)
 
+    def populate_table(self):
+        self.view.show(self.filtered_rows)
         self.update_results_count()
-        print("populate_table: finished")
 
     def on_search_change(self, var_name, index, mode):
         print(f"on_search_change: Search query changed to '{self.search_var.get()}'")
-        query = self.search_var.get().lower()
-        if not query:
-            self.filtered_df = self.df.copy()
-        else:
-            # === IMPORTANT: Use the RENAMED column name for searching ===
-            search_cols = ['CatID', 'Category', 'SubCategory', 'Explanations', 'Synonyms']
-            self.filtered_df = self.df[
-                self.df[search_cols].astype(str).apply(lambda row: row.str.lower().str.contains(query).any(), axis=1)
-            ].copy()
+        if self.searcher is None:
+            return
+        # Literal, case-insensitive; every space separated term must match (in any column).
+        # Filtering runs on the searcher's thread; a newer keystroke cancels it
+        self.searcher.submit(self.search_var.get())
+        if self._search_poll is None:
+            self._search_poll = self.after(SEARCH_POLL_MS, self.poll_search)
+
+    def poll_search(self):
+        """Show the newest search result once it's ready"""
+        self._search_poll = None
+        result = self.searcher.poll()
+        if result is None:
+            self._search_poll = self.after(SEARCH_POLL_MS, self.poll_search)
+            return
+        self.filtered_rows = result.rows
         self.populate_table()
 
+    def destroy(self):
+        if self._search_poll is not None:
+            self.after_cancel(self._search_poll)
+            self._search_poll = None
+        if self.searcher is not None:
+            self.searcher.close()
+        super().destroy()
+
     def update_results_count(self):
-        if self.filtered_df is not None:
-            count = len(self.filtered_df)
-            self.results_label.configure(text=f"Results: {count}")
-        else:
-            self.results_label.configure(text="Results: 0")
+        self.results_label.configure(text=f"Results: {len(self.filtered_rows)}")
 
     def get_selected_row_values(self):
         selected_item = self.tree.focus()
@@ -228,4 +352,91 @@ class UCSPopup(ctk.CTkToplevel):
             self.populate_parent_entries_and_close(selected_values)
         else:
             CTkMessagebox(title="Selection Required", message="Please select a row from the table.",
-                              icon="info", option_1="OK", master=self)
\ No newline at end of file
+                              icon="info", option_1="OK", master=self)
+
+
+class ClassificationReview(ctk.CTkToplevel):
+    """
+    Review window for batch CatID suggestions (see ucsData.UCSClassifier)
+
+    One row per file with its best suggestion, confidence and current CatID.
+    Files without a CatID and a confident suggestion (see ucsData.preselected) start
+    selected; double-clicking a row cycles through its other suggestions.
+    Apply passes {file: UCS row} for the selected files to on_apply.
+    """
+
+    REVIEW_COLUMNS = ('File', 'CatID', 'Category', 'SubCategory', 'Confidence', 'Current')
+
+    def __init__(self, master, results, columns, current, on_apply):
+        """
+        Args:
+            results: {file: [Classification, ...]} best first
+            columns: UCS columns the classifications refer to
+            current: {file: CatID already set ('' if none)}
+            on_apply: Called with {file: UCS row} for the accepted files
+        """
+        super().__init__(master)
+        self.title("Auto-Classify Review")
+        self.geometry("1000x500")
+        self.grab_set()
+        self.columns = columns
+        self.current = current
+        self.on_apply = on_apply
+        self.results = {file: suggestions for file, suggestions in results.items() if suggestions}
+        self.choice = {file: 0 for file in self.results}  # Index of the shown suggestion
+        self.items = {}  # Tree item ID -> file
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        container = ctk.CTkFrame(self)
+        container.grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
+        container.grid_rowconfigure(0, weight=1)
+        container.grid_columnconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(container, columns=self.REVIEW_COLUMNS, show="headings", selectmode="extended")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        vsb = ctk.CTkScrollbar(container, command=self.tree.yview)
+        vsb.grid(row=0, column=1, sticky="ns")
+        self.tree.configure(yscrollcommand=vsb.set)
+        for col, width, stretch in zip(self.REVIEW_COLUMNS, (360, 90, 110, 130, 80, 90), (True, False, False, False, False, False)):
+            self.tree.heading(col, text=col, anchor="w")
+            self.tree.column(col, width=width, minwidth=50, stretch=stretch)
+        self.tree.bind("<Double-1>", self.on_double_click)
+
+        preselected = ucsData.preselected(self.results, current)
+        selected = []
+        for file in self.results:
+            item = self.tree.insert("", "end", values=self.row_values(file))
+            self.items[item] = file
+            if file in preselected:
+                selected.append(item)
+        self.tree.selection_set(selected)
+
+        self.summary_label = ctk.CTkLabel(self, text=f"{len(self.results)} of {len(results)} files have suggestions")
+        self.summary_label.grid(row=1, column=0, padx=10, sticky="w")
+        self.apply_button = ctk.CTkButton(self, text="Apply Selected", command=self.on_apply_button,
+                                          fg_color="#9f005e", hover_color="#8a0051")
+        self.apply_button.grid(row=1, column=1, padx=10, pady=10, sticky="e")
+
+    def row_values(self, file):
+        suggestion = self.results[file][self.choice[file]]
+        return (file, suggestion.catid, self.columns['Category'][suggestion.row],
+                self.columns['SubCategory'][suggestion.row], f"{suggestion.confidence:.0%}", self.current.get(file, ''))
+
+    def on_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        file = self.items.get(item)
+        if file is None:
+            return
+        self.choice[file] = (self.choice[file] + 1) % len(self.results[file])
+        self.tree.item(item, values=self.row_values(file))
+
+    def on_apply_button(self):
+        chosen = {}
+        for item in self.tree.selection():
+            file = self.items[item]
+            chosen[file] = self.results[file][self.choice[file]].row
+        if chosen:
+            self.on_apply(chosen)
+        self.destroy()
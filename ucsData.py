@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+
+import csv
+import os
+import math
+import pickle
+import queue
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from atomicFile import write_atomic
+
+"""
+UCS Data - Compiled cache of the UCS category list
+The spreadsheet (or a CSV export of it) is streamed row by row into one tuple
+of interned strings per column. Parsing still takes a while, so the table is
+stored in a pickle keyed by the file's path, mtime and size, and later loads
+read that instead
+"""
+
+# Columns read from the spreadsheet and the names they're shown under
+EXCEL_COLUMNS = ['CatID', 'Category', 'SubCategory', 'Explanations', 'Synonyms - Comma Separated']
+COLUMN_RENAMES = {'Synonyms - Comma Separated': 'Synonyms'}
+COLUMNS = [COLUMN_RENAMES.get(column, column) for column in EXCEL_COLUMNS]
+
+# Header row of the UCS spreadsheet, counted from 0 (the data starts on the row after it)
+HEADER_ROW = 2
+
+CACHE_FILE = 'ucs_cache.pickle'
+
+# Bump when the cached layout changes so old caches are rebuilt
+CACHE_VERSION = 2
+
+# {column: (cell text, ...)}, one entry per row, empty cells as ''
+Columns = Dict[str, Tuple[str, ...]]
+
+# Columns the popup search looks in
+SEARCH_COLUMNS = ['CatID', 'Category', 'SubCategory', 'Explanations', 'Synonyms']
+
+# Lengths of the n-grams in the search index; single characters are matched by scanning
+MIN_NGRAM = 2
+NGRAM = 3
+
+# Joins a row's fields in the search text so a term can't match across two fields
+FIELD_SEPARATOR = '\x00'
+
+# Rows a background search filters between checks for a newer query
+SEARCH_CHUNK_ROWS = 2000
+
+# Suggestions offered by CatID autocomplete
+AUTOCOMPLETE_LIMIT = 8
+
+# BM25 parameters of the filename classifier, and how much each column's words count
+BM25_K1 = 1.2
+BM25_B = 0.75
+CLASSIFIER_FIELD_WEIGHTS = {'Category': 2, 'SubCategory': 3, 'Synonyms': 1}
+
+# Suggestions at or above this confidence start selected in the classification review
+REVIEW_CONFIDENCE = 0.5
+
+# Words too common in filenames (and the UCS vocabulary) to say anything about the category
+STOP_WORDS = frozenset(('a', 'an', 'and', 'at', 'by', 'for', 'from', 'in', 'into', 'of', 'on', 'or',
+                        'the', 'to', 'with', 'wav', 'stereo', 'mono'))
+
+_WORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+
+def cache_path(excel_path: str, cache_dir: Optional[str] = None) -> str:
+    """Cache file for a spreadsheet (next to it unless cache_dir is given)"""
+    return os.path.join(cache_dir or os.path.dirname(os.path.abspath(excel_path)), CACHE_FILE)
+
+
+def source_key(excel_path: str) -> Tuple[str, int, int]:
+    """(absolute path, mtime in ns, size) that a cache must match"""
+    st = os.stat(excel_path)
+    return os.path.abspath(excel_path), st.st_mtime_ns, st.st_size
+
+
+def cell_text(value) -> str:
+    """Text of a cell as the table stores it (whole numbers without a trailing .0)"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def read_rows(rows: Iterable[tuple]) -> Columns:
+    """
+    Collect COLUMNS from rows of cell values, the header being row HEADER_ROW
+
+    Rows are consumed one at a time; blank rows are skipped and every cell is
+    interned, so repeated categories share a single string.
+
+    Raises:
+        KeyError: A column of EXCEL_COLUMNS is missing
+    """
+    rows = iter(rows)
+    header = None
+    for _ in range(HEADER_ROW + 1):
+        header = next(rows, None)
+    names = [cell_text(value).strip() for value in header or ()]
+    missing = [column for column in EXCEL_COLUMNS if column not in names]
+    if missing:
+        raise KeyError(f"UCS list is missing the column(s) {', '.join(missing)}")
+    positions = [names.index(column) for column in EXCEL_COLUMNS]
+
+    cells = [[] for _ in EXCEL_COLUMNS]
+    for row in rows:
+        values = [cell_text(row[position]) if position < len(row) else '' for position in positions]
+        if not any(values):
+            continue
+        for column, value in zip(cells, values):
+            column.append(sys.intern(value))
+    return {COLUMN_RENAMES.get(column, column): tuple(values) for column, values in zip(EXCEL_COLUMNS, cells)}
+
+
+def read_excel_columns(excel_path: str) -> Columns:
+    """
+    Parse the spreadsheet (slow), streaming it in read-only mode
+
+    Raises:
+        KeyError: A column of EXCEL_COLUMNS is missing
+    """
+    from openpyxl import load_workbook  # Only needed when the cache is rebuilt
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        return read_rows(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def read_csv_columns(csv_path: str) -> Columns:
+    """
+    Parse a CSV export of the spreadsheet (same layout, header on row HEADER_ROW)
+
+    Raises:
+        KeyError: A column of EXCEL_COLUMNS is missing
+    """
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        return read_rows(csv.reader(f))
+
+
+def read_columns(path: str) -> Columns:
+    """Parse the UCS list from an .xlsx spreadsheet or a .csv export of it"""
+    if path.lower().endswith('.csv'):
+        return read_csv_columns(path)
+    return read_excel_columns(path)
+
+
+def read_cache(path: str, key: Tuple[str, int, int]) -> Optional[Columns]:
+    """Cached columns if the cache exists and was built from the same spreadsheet, otherwise None"""
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+        print(f"Ignoring unreadable UCS cache {path}: {e}")
+        return None
+    if not isinstance(data, dict) or data.get('version') != CACHE_VERSION or data.get('source') != key:
+        return None
+    return data['columns']
+
+
+def write_cache(path: str, key: Tuple[str, int, int], columns: Columns):
+    """Write the cache atomically (see atomicFile.write_atomic)"""
+    data = {'version': CACHE_VERSION, 'source': key, 'columns': columns}
+    write_atomic(path, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), prefix='.ucs-')
+
+
+def load_ucs_columns(excel_path: str, cache_dir: Optional[str] = None) -> Columns:
+    """
+    UCS table as {column: (cell text, ...)}, from the cache when it's current
+
+    The spreadsheet is parsed (and the cache rewritten) only when its path,
+    mtime or size differ from what the cache was built from.
+
+    Raises:
+        FileNotFoundError: The spreadsheet doesn't exist
+        KeyError: A column of EXCEL_COLUMNS is missing
+    """
+    key = source_key(excel_path)
+    path = cache_path(excel_path, cache_dir)
+    columns = read_cache(path, key)
+    if columns is not None:
+        return columns
+
+    columns = read_columns(excel_path)
+    try:
+        write_cache(path, key, columns)
+    except OSError as e:
+        print(f"Error writing UCS cache {path}: {e}")
+    return columns
+
+
+class UCSSearchIndex:
+    """
+    Substring search over the UCS rows, built once per table
+
+    Every row's search fields are lower-cased and joined into one string, and
+    an inverted index maps each bigram and trigram to the rows containing it.
+    A query is split on whitespace and a row matches if it contains every
+    term literally (in any field). The n-grams of the longest term pick the
+    candidate rows, which are then checked with plain substring tests.
+    """
+
+    def __init__(self, columns: Columns, fields: List[str] = SEARCH_COLUMNS):
+        """
+        Args:
+            columns: {column: (cell text, ...)} as returned by load_ucs_columns
+            fields: Columns to search
+        """
+        fields = [columns[field] for field in fields]
+        self.texts = [FIELD_SEPARATOR.join(cells).lower() for cells in zip(*fields)]
+        postings = defaultdict(list)
+        for row, text in enumerate(self.texts):
+            grams = set()
+            for field in text.split(FIELD_SEPARATOR):
+                for n in range(MIN_NGRAM, NGRAM + 1):
+                    grams.update([field[i:i + n] for i in range(len(field) - n + 1)])
+            for gram in grams:
+                postings[gram].append(row)
+        self.postings = {gram: array('I', rows) for gram, rows in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def search(self, query: str, rows: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        Rows (in table order) that contain every whitespace separated term of query
+
+        Args:
+            query: Search text; matched literally and case-insensitively
+            rows: Only look at these rows (ascending), e.g. the result of a
+                query this one refines
+        """
+        terms = query.lower().split()
+        if not terms:
+            return list(range(len(self.texts)) if rows is None else rows)
+        if rows is None:
+            rows = self.candidates(query)
+        texts = self.texts
+        for term in sorted(terms, key=len, reverse=True):
+            rows = [row for row in rows if term in texts[row]]
+        return rows
+
+    def candidates(self, query: str) -> List[int]:
+        """Rows that may match query (a superset of search(query), from the index alone)"""
+        terms = query.lower().split()
+        longest = max(terms, key=len, default='')
+        if len(longest) < MIN_NGRAM:
+            return range(len(self.texts))
+        return self._candidates(longest)
+
+    def _candidates(self, term: str) -> List[int]:
+        """Rows containing the two rarest n-grams of term (a superset of the matches)"""
+        n = min(len(term), NGRAM)
+        lists = []
+        for i in range(len(term) - n + 1):
+            posting = self.postings.get(term[i:i + n])
+            if posting is None:
+                return []
+            lists.append(posting)
+        lists.sort(key=len)
+        if len(lists) == 1:
+            return lists[0]
+        second = set(lists[1])
+        return [row for row in lists[0] if row in second]
+
+
+def is_refinement(query: str, previous: str) -> bool:
+    """True if every row matching query also matches previous (each old term is inside a new one)"""
+    terms = query.lower().split()
+    return all(any(old in term for term in terms) for old in previous.lower().split())
+
+
+class SearchResult(NamedTuple):
+    """Rows matching one query of a BackgroundSearch"""
+    generation: int
+    query: str
+    rows: List[int]
+
+
+class BackgroundSearch:
+    """
+    Run UCSSearchIndex queries on a worker thread so typing never blocks the UI
+
+    Only the newest query matters: submitting one makes any search still in
+    progress stale, and it stops at its next chunk boundary. A query that
+    refines the last completed one ("whoo" -> "whoos") only filters that
+    query's rows. Results are posted to self.results for the UI to poll.
+    """
+
+    def __init__(self, index: UCSSearchIndex):
+        self.index = index
+        self.results = queue.Queue()
+        self.generation = 0
+        self._query = None
+        self._last = ('', list(range(len(index))))  # Last completed (query, rows)
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='UCSSearch', daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str) -> int:
+        """Search for query (replacing any pending query) and return its generation"""
+        self.generation += 1
+        self._query = (self.generation, query)
+        self._wakeup.set()
+        return self.generation
+
+    def poll(self) -> Optional[SearchResult]:
+        """Result of the newest query if it has finished, without blocking"""
+        latest = None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if result.generation == self.generation:
+                latest = result
+        return latest
+
+    def close(self):
+        """Stop the worker thread"""
+        self._closed = True
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                return
+            generation, query = self._query
+            rows = self._search(generation, query)
+            if rows is not None:
+                self._last = (query, rows)
+                self.results.put(SearchResult(generation, query, rows))
+
+    def _search(self, generation: int, query: str) -> Optional[List[int]]:
+        """Rows matching query, or None if a newer query arrived first"""
+        previous, previous_rows = self._last
+        rows = previous_rows if is_refinement(query, previous) else self.index.candidates(query)
+        matches = []
+        for start in range(0, len(rows), SEARCH_CHUNK_ROWS):
+            if generation != self.generation or self._closed:
+                return None
+            matches.extend(self.index.search(query, rows[start:start + SEARCH_CHUNK_ROWS]))
+        return matches
+
+
+class UCSPrefixIndex:
+    """
+    Prefix lookup over the UCS rows for CatID autocomplete
+
+    Keeps sorted key lists for the CatIDs, the "category subcategory" pairs
+    and subcategories, and the synonyms; the keys starting with a prefix are
+    a bisect range in each. CatID matches rank first, then names, then
+    synonyms.
+    """
+
+    def __init__(self, columns: Columns):
+        """
+        Args:
+            columns: {column: (cell text, ...)} as returned by load_ucs_columns
+        """
+        catids, names, synonyms = [], [], []
+        for row, (catid, category, subcategory, synonym_list) in enumerate(zip(
+                columns['CatID'], columns['Category'], columns['SubCategory'], columns['Synonyms'])):
+            catids.append((catid.lower(), row))
+            names.append((f"{category} {subcategory}".lower(), row))
+            names.append((subcategory.lower(), row))
+            synonyms.extend((synonym.strip().lower(), row) for synonym in synonym_list.split(',') if synonym.strip())
+        self._lists = []
+        for entries in (catids, names, synonyms):
+            entries.sort()
+            self._lists.append(([key for key, _ in entries], [row for _, row in entries]))
+
+    def complete(self, prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[int]:
+        """Up to limit rows (best first) with a CatID, name or synonym starting with prefix"""
+        prefix = prefix.strip().lower()
+        found = {}
+        if not prefix:
+            return []
+        for keys, rows in self._lists:
+            for i in range(bisect_left(keys, prefix), len(keys)):
+                if len(found) >= limit or not keys[i].startswith(prefix):
+                    break
+                found.setdefault(rows[i])
+        return list(found)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case words of a filename or UCS cell
+
+    CamelCase is split ("PowerUp" -> power, up), numbers and stop words are
+    dropped and a plural 's' is stripped so "wheels" matches "wheel".
+    """
+    words = []
+    for word in _WORD.findall(text):
+        word = word.lower()
+        if word.isdigit() or len(word) < 2 or word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+class Classification(NamedTuple):
+    """One suggested UCS row for a file"""
+    row: int
+    catid: str
+    score: float
+    confidence: float   # 0-1: share of the best achievable score for the file's words
+
+
+def preselected(results: Dict[str, List[Classification]], current: Dict[str, str]) -> Set[str]:
+    """
+    Files whose suggestion should start selected in the review
+
+    Args:
+        results: {file: suggestions, best first}
+        current: {file: its CatID}
+    Returns:
+        Files without a CatID whose best suggestion has at least REVIEW_CONFIDENCE
+    """
+    return {file for file, suggestions in results.items()
+            if suggestions and not current.get(file) and suggestions[0].confidence >= REVIEW_CONFIDENCE}
+
+
+class UCSClassifier:
+    """
+    Suggest CatIDs for filenames with BM25 over the UCS vocabulary
+
+    Every UCS row is a document made of its Category, SubCategory and
+    Synonyms words (weighted by CLASSIFIER_FIELD_WEIGHTS). The BM25 weight
+    of every (word, row) pair is computed once into a sparse inverted
+    index, so scoring a filename is a few dictionary lookups per word.
+    A filename that already starts with a CatID followed by '_' gets that
+    row with confidence 1.
+    """
+
+    def __init__(self, columns: Columns, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            columns: {column: (cell text, ...)} as returned by load_ucs_columns
+        """
+        self.catids = columns['CatID']
+        self.rows_by_catid = {catid: row for row, catid in enumerate(self.catids) if catid}
+
+        counts = []
+        for row in range(len(self.catids)):
+            tf = {}
+            for field, weight in CLASSIFIER_FIELD_WEIGHTS.items():
+                for word in tokenize(columns[field][row]):
+                    tf[word] = tf.get(word, 0) + weight
+            counts.append(tf)
+
+        documents = len(counts)
+        average_length = sum(sum(tf.values()) for tf in counts) / max(1, documents)
+        frequency = {}
+        for tf in counts:
+            for word in tf:
+                frequency[word] = frequency.get(word, 0) + 1
+
+        postings = defaultdict(list)
+        for row, tf in enumerate(counts):
+            norm = k1 * (1 - b + b * sum(tf.values()) / average_length) if average_length else k1
+            for word, count in tf.items():
+                idf = math.log(1 + (documents - frequency[word] + 0.5) / (frequency[word] + 0.5))
+                postings[word].append((row, idf * count * (k1 + 1) / (count + norm)))
+        self.postings = dict(postings)
+        # Best weight each word reaches in any row, for the confidence
+        self.best = {word: max(weight for _, weight in rows) for word, rows in self.postings.items()}
+
+    def classify(self, filename: str, limit: int = 3) -> List[Classification]:
+        """Best matching UCS rows for a filename (best first, at most limit)"""
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        prefix = stem.split('_', 1)[0]
+        if '_' in stem and prefix in self.rows_by_catid:
+            row = self.rows_by_catid[prefix]
+            return [Classification(row, prefix, 0.0, 1.0)]
+
+        scores = {}
+        words = set(tokenize(stem))
+        for word in words:
+            for row, weight in self.postings.get(word, ()):
+                scores[row] = scores.get(row, 0.0) + weight
+        if not scores:
+            return []
+        ideal = sum(self.best.get(word, 0.0) for word in words)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [Classification(row, self.catids[row], score, score / ideal) for row, score in ranked]
+
+    def classify_many(self, filenames: Iterable[str], limit: int = 3) -> Dict[str, List[Classification]]:
+        """classify() for a batch of filenames"""
+        return {filename: self.classify(filename, limit) for filename in filenames}
+
+
+class UCSCatalog:
+    """
+    The UCS table with its search structures, shared by everything that needs it
+
+    Built once per spreadsheet (see load_catalog) and reused by every
+    UCSPopup, the CatID autocomplete and the classifier.
+    """
+
+    def __init__(self, columns: Columns, source: Optional[Tuple[str, int, int]] = None):
+        """
+        Args:
+            columns: {column: (cell text, ...)} as returned by load_ucs_columns
+            source: source_key() of the spreadsheet the columns came from
+        """
+        self.source = source
+        self.columns = columns
+        self.rows = list(zip(*(columns[column] for column in COLUMNS)))
+        self.search_index = UCSSearchIndex(columns)
+        self.prefix_index = UCSPrefixIndex(columns)
+        self._classifier = None
+        self._classifier_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def classifier(self) -> UCSClassifier:
+        """Filename classifier over this table (built by warm_up, or on first use)"""
+        with self._classifier_lock:
+            if self._classifier is None:
+                self._classifier = UCSClassifier(self.columns)
+            return self._classifier
+
+
+_catalogs: Dict[str, UCSCatalog] = {}  # Spreadsheet path -> catalog
+_catalog_errors: Dict[str, Exception] = {}  # Spreadsheet path -> why its last load failed
+_catalog_lock = threading.Lock()
+_warm_ups: Dict[str, threading.Thread] = {}  # Spreadsheet path -> warm-up thread
+_warm_up_lock = threading.Lock()
+
+
+def load_catalog(excel_path: str, cache_dir: Optional[str] = None) -> UCSCatalog:
+    """
+    Shared catalog of a spreadsheet, built on first use and rebuilt if the file changed
+
+    Thread-safe: a caller that arrives while another thread (e.g. warm_up)
+    is building the catalog waits for it instead of building a second one.
+
+    Raises:
+        FileNotFoundError: The spreadsheet doesn't exist
+        KeyError: A column of EXCEL_COLUMNS is missing
+    """
+    path = os.path.abspath(excel_path)
+    try:
+        key = source_key(excel_path)
+        with _catalog_lock:
+            catalog = _catalogs.get(path)
+            if catalog is None or catalog.source != key:
+                catalog = UCSCatalog(load_ucs_columns(excel_path, cache_dir), key)
+                _catalogs[path] = catalog
+    except Exception as e:
+        _catalog_errors[path] = e
+        raise
+    _catalog_errors.pop(path, None)
+    return catalog
+
+
+def catalog_if_ready(excel_path: str) -> Optional[UCSCatalog]:
+    """
+    The shared catalog if it has been built, otherwise None
+
+    Never waits for a build in progress or touches the file, so it's safe to
+    call on every keystroke.
+    """
+    return _catalogs.get(os.path.abspath(excel_path))
+
+
+def catalog_error(excel_path: str) -> Optional[Exception]:
+    """Why the last load of the spreadsheet failed, or None if it didn't"""
+    return _catalog_errors.get(os.path.abspath(excel_path))
+
+
+def warm_up(excel_path: str, cache_dir: Optional[str] = None) -> threading.Thread:
+    """
+    Build the shared catalog and its classifier on a background thread so the
+    first use doesn't wait
+
+    Returns the running warm-up instead of starting another one if there is one.
+    """
+    def run():
+        start = time.perf_counter()
+        try:
+            catalog = load_catalog(excel_path, cache_dir)
+            catalog.classifier
+        except Exception as e:
+            print(f"UCS warm-up failed: {e}")
+            return
+        print(f"UCS warm-up: {len(catalog)} rows ready in {time.perf_counter() - start:.2f} s")
+
+    path = os.path.abspath(excel_path)
+    with _warm_up_lock:
+        thread = _warm_ups.get(path)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=run, name='UCSWarmUp', daemon=True)
+            _warm_ups[path] = thread
+            thread.start()
+    return thread